@@ -4,24 +4,36 @@ import pickle
 from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.core.cache.backends.db import DatabaseCache
 from django.db import connection
+from django.utils.functional import cached_property
 
 
 class LocalMemoryDatabaseCache(DatabaseCache):
     def __init__(self, table, params):
         super().__init__(table, params)
+        self.key_func = self.key_function
+        # read by main.instrumentation
+        self.hits = 0
+        self.misses = 0
+
+    @cached_property
+    def cache(self):
+        """The whole table, loaded on the first use instead of at startup."""
         with connection.cursor() as cursor:
             cursor.execute('SELECT cache_key, value FROM cache_table')  # noqa
-            self.cache = {
+            return {
                 cache_key: pickle.loads(base64.b64decode(connection.ops.process_clob(value).encode()))
                 for cache_key, value in cursor.fetchall()
             }
-        self.key_func = self.key_function
 
     @staticmethod
     def key_function(key, *_):
         return key
 
     def get(self, key, default=None, version=None):
+        if key in self.cache:
+            self.hits += 1
+        else:
+            self.misses += 1
         return self.cache.get(key)
 
     def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
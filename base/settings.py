@@ -2,6 +2,14 @@ from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 EXPORT_DIR = Path('G:\\RenPyProjects\\simulation-admin\\kernel')
+# Character relationships with this value are neither stored nor exported, the game falls back to it. None keeps all.
+RELATIONSHIPS_DEFAULT_VALUE = None
+# Log queries count and time, slowest and repeated queries and cache hits of every request, see main.instrumentation.
+QUERY_INSTRUMENTATION = False
+# {regex searched in the request path or the command name: max queries}, checked for instrumented requests and commands.
+QUERY_BUDGETS = {}
+# Raise QueryBudgetExceeded instead of logging a warning.
+QUERY_BUDGETS_RAISE = False
 
 SECRET_KEY = 'django-insecure-v^ukbum=*m52hh==%moe=b#xv(hh4jkih#x-iwby-@4uv$v8(@'
 
@@ -20,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,6 +94,22 @@ STATIC_URL = '/static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'main': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
 CACHES = {
     'default': {
         'BACKEND': 'base.cache.LocalMemoryDatabaseCache',
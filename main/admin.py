@@ -1,10 +1,17 @@
 import datetime
 
+from contextvars import ContextVar
+
 from django.apps import apps
 from django.contrib import admin
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldError
+from django.utils.html import format_html, format_html_join
+from main.effects import preview_effects
+from main.filters import get_filter_preview
 from main.forms import (
     CharacterForm,
+    CharacterRelationshipFormset,
     CharacterDataEffectsForm,
     CharacterDataFiltersForm,
     CharacterDataPlanFiltersForm,
@@ -26,6 +33,7 @@ from main.models import (
     CharacterDataPlanFilters,
     CharacterRelationship,
     EventLog,
+    EventRollup,
     Faction,
     FactionRelationship,
     Place,
@@ -44,9 +52,22 @@ from main.models import (
     Settlement,
     SettlementPosition
 )
+from main.paginator import EstimatedCountPaginator, KeysetChangeList
+from main.utils import PLAYER_ID
+
+preview_character_id = ContextVar('preview_character_id', default=PLAYER_ID)
+_admin_user = None
+
+
+def get_admin_user():
+    """The first user acts in the admin, it has no login. Queried on the first request, not at import."""
+    global _admin_user
+    if _admin_user is None:
+        _admin_user = User.objects.first()
+    return _admin_user
+
 
-user = User.objects.first()
-admin.site.has_permission = lambda r: setattr(r, 'user', user) or True
+admin.site.has_permission = lambda r: setattr(r, 'user', get_admin_user()) or True
 
 for app_config in apps.get_app_configs():
     for model in app_config.get_models():
@@ -54,17 +75,114 @@ for app_config in apps.get_app_configs():
             admin.site.unregister(model)
 
 
+def get_distribution_display(distribution):
+    if not distribution:
+        return '-'
+    return 'min {min:g}, median {median:g}, mean {mean:g}, max {max:g}'.format(**distribution)
+
+
+class PreviewCharacterMixin:
+    """Character for readonly previews from "?preview_character=<id>" (player by default)."""
+    preview_field = None
+
+    def get_readonly_fields(self, request, obj=None):
+        return [*super().get_readonly_fields(request, obj), self.preview_field]
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        token = preview_character_id.set(request.GET.get('preview_character') or PLAYER_ID)
+        try:
+            response = super().changeform_view(request, object_id, form_url, extra_context)
+            if hasattr(response, 'render'):
+                response.render()  # readonly fields are rendered lazily
+            return response
+        finally:
+            preview_character_id.reset(token)
+
+    @staticmethod
+    def get_preview_character():
+        try:
+            char = Character.objects.filter(id=preview_character_id.get()).first()
+        except ValueError:  # not a number id
+            char = None
+        return char, ('Character', f'{char or "not found"} (?preview_character=<id> to change)')
+
+
+class FiltersPreviewMixin(PreviewCharacterMixin):
+    """Shows matches count and sample of JSON filters fields, placeholders are bound to the preview character."""
+    preview_field = 'filters_preview'
+    preview_fields = {}  # field name: filtered model
+    preview_sample_size = 5
+
+    @admin.display(description='Filters preview')
+    def filters_preview(self, obj):
+        char, char_item = self.get_preview_character()
+        items = [char_item]
+        for field_name, model in self.preview_fields.items():
+            filters = getattr(obj, field_name)
+            if not filters:
+                continue
+            try:
+                count, objects = get_filter_preview(
+                    model.objects.all(), filters, char=char, sample_size=self.preview_sample_size
+                )
+            except (FieldError, TypeError, ValueError) as e:
+                items.append((field_name, f'error: {e}'))
+                continue
+            sample = ', '.join([str(item) for item in objects])
+            items.append((field_name, f'{count} {model.__name__.lower()} matches{": " if sample else ""}{sample}'))
+        return format_html_join(format_html('<br>'), '{}: {}', items)
+
+
+class KeysetPaginationMixin:
+    """Seek pages by the ordering columns and a bounded count for big tables."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/main/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
 @admin.register(CharacterDataEffects)
-class CharacterDataEffectsAdmin(admin.ModelAdmin):
+class CharacterDataEffectsAdmin(PreviewCharacterMixin, admin.ModelAdmin):
     form = CharacterDataEffectsForm
     ordering = ['id']
+    preview_field = 'effects_preview'
+
+    @admin.display(description='Effects preview')
+    def effects_preview(self, obj):
+        char, char_item = self.get_preview_character()
+        try:
+            preview = preview_effects(obj, other_char=char)
+        except (TypeError, ValueError) as e:
+            # modifiers the JSON validators accept can still name attrs the compiler doesn't know
+            return f'error: {e}'
+        items = [
+            ('Other character', char_item[1]),
+            ('Characters', preview['characters']),
+            ('Modifiers', get_distribution_display(preview.get('factors'))),
+        ]
+        for prefix, changes in [
+            ('', preview.get('attrs', {})),
+            ('settlement ', preview.get('settlements', {})),
+            ('place settlement ', preview.get('place_settlements', {})),
+            ('', {'relationships': preview['relationships']} if 'relationships' in preview else {}),
+        ]:
+            for attr, attr_changes in changes.items():
+                items.append((f'{prefix}{attr}', '{} > {}, changed: {}'.format(
+                    get_distribution_display(attr_changes['before']),
+                    get_distribution_display(attr_changes['after']),
+                    attr_changes['changed']
+                )))
+        return format_html_join(format_html('<br>'), '{}: {}', items)
 
     def has_module_permission(self, request):
         return False
 
 
 @admin.register(CharacterDataFilters)
-class CharacterDataFiltersAdmin(admin.ModelAdmin):
+class CharacterDataFiltersAdmin(FiltersPreviewMixin, admin.ModelAdmin):
+    preview_fields = {'filters': Character}
     form = CharacterDataFiltersForm
     ordering = ['title']
 
@@ -120,9 +238,10 @@ class PlanAdmin(admin.ModelAdmin):
 
 
 @admin.register(EventLog)
-class EventLogAdmin(admin.ModelAdmin):
+class EventLogAdmin(KeysetPaginationMixin, admin.ModelAdmin):
     ordering = ['first_character_id', 'timestamp']
     list_display = ['get_time', 'first_character', 'second_character', 'get_plan_title', 'is_important']
+    list_select_related = ['first_character', 'second_character', 'plan']
 
     @admin.display(description='time')
     def get_time(self, obj):
@@ -130,7 +249,14 @@ class EventLogAdmin(admin.ModelAdmin):
 
     @admin.display(description='plan')
     def get_plan_title(self, obj):
-        return obj.plan.title
+        return obj.plan.title if obj.plan else '-'
+
+
+@admin.register(EventRollup)
+class EventRollupAdmin(admin.ModelAdmin):
+    ordering = ['dimension', '-count']
+    list_display = ['dimension', 'key', 'count']
+    list_filter = ['dimension']
 
 
 @admin.register(Stage)
@@ -177,7 +303,8 @@ class PlanSetFiltersAdmin(admin.ModelAdmin):
 
 
 @admin.register(PlanPlaceFilters)
-class PlanPlaceFilterAdmin(admin.ModelAdmin):
+class PlanPlaceFilterAdmin(FiltersPreviewMixin, admin.ModelAdmin):
+    preview_fields = {'filters': Place}
     form = PlanPlaceFiltersForm
     ordering = ['title']
 
@@ -186,7 +313,8 @@ class PlanPlaceFilterAdmin(admin.ModelAdmin):
 
 
 @admin.register(PlanLock)
-class PlanLockAdmin(admin.ModelAdmin):
+class PlanLockAdmin(FiltersPreviewMixin, admin.ModelAdmin):
+    preview_fields = {'close_filters': Place, 'open_filters': Place}
     form = PlanLockForm
     ordering = ['id']
 
@@ -223,9 +351,23 @@ class RouteAdmin(admin.ModelAdmin):
 
 
 class CharacterRelationshipInline(admin.TabularInline):
+    """Pages of relationships ("?rel_page=<n>&rel_q=<name>") with other characters chosen by autocomplete."""
     model = CharacterRelationship
+    formset = CharacterRelationshipFormset
     extra = 1
     fk_name = 'from_character'
+    autocomplete_fields = ['to_character']
+    template = 'admin/main/character/relationships_inline.html'
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        try:
+            formset.page = int(request.GET.get('rel_page', 1))
+        except ValueError:
+            formset.page = 1
+        formset.search = request.GET.get('rel_q', '').strip()
+        formset.params = request.GET
+        return formset
 
 
 class CharacterPlaceInline(admin.TabularInline):
@@ -237,6 +379,7 @@ class CharacterPlaceInline(admin.TabularInline):
 @admin.register(Character)
 class CharacterAdmin(admin.ModelAdmin):
     list_display = ['first_name', 'last_name', 'faction', 'place']
+    search_fields = ['first_name', 'last_name']
     ordering = ['first_name']
     inlines = [CharacterPlaceInline, CharacterRelationshipInline]
     form = CharacterForm
@@ -258,8 +401,10 @@ class CharacterAdmin(admin.ModelAdmin):
 
 
 @admin.register(CharacterRelationship)
-class CharacterRelationshipAdmin(admin.ModelAdmin):
+class CharacterRelationshipAdmin(KeysetPaginationMixin, admin.ModelAdmin):
+    ordering = ['from_character', 'to_character']
     list_display = ['from_character', 'to_character', 'value']
+    list_select_related = ['from_character', 'to_character']
 
 
 class FactionRelationshipInline(admin.TabularInline):
@@ -286,12 +431,20 @@ class SettlementAdmin(admin.ModelAdmin):
 
 
 @admin.register(SettlementPosition)
-class SettlementPositionAdmin(admin.ModelAdmin):
+class SettlementPositionAdmin(FiltersPreviewMixin, admin.ModelAdmin):
+    preview_fields = {'character_filters': Character}
     list_display = ['name', 'population_ratio', 'is_voting', 'value']
     ordering = ['-value']
     form = SettlementPositionForm
 
 
+@admin.register(PlaceTransition)
+class PlaceTransitionAdmin(KeysetPaginationMixin, admin.ModelAdmin):
+    ordering = ['from_place', 'to_place']
+    list_display = ['from_place', 'to_place', 'distance']
+    list_select_related = ['from_place', 'to_place']
+
+
 class PlaceTransitionInline(admin.TabularInline):
     model = PlaceTransition
     formset = PlaceTransitionFormset
@@ -300,7 +453,8 @@ class PlaceTransitionInline(admin.TabularInline):
 
 
 @admin.register(Place)
-class PlaceAdmin(admin.ModelAdmin):
+class PlaceAdmin(FiltersPreviewMixin, admin.ModelAdmin):
+    preview_fields = {'lock_filters': Character}
     ordering = ['id']
     list_display = ['name', 'title', 'is_locked', 'beauty', 'safety', 'fertility']
     inlines = [PlaceTransitionInline]
@@ -0,0 +1,4 @@
+"""
+Performance baselines: wall time, peak memory and queries count of the build commands, the export, the cache warmup,
+the admin pages and the command startup on synthetic worlds of several sizes, run by the benchmark command.
+"""
@@ -0,0 +1,46 @@
+import time
+import tracemalloc
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+METRICS = ('seconds', 'peak_memory', 'queries')
+
+
+def measure(func, trace_memory=True):
+    """Wall time, peak traced memory in bytes (None if not traced) and queries count of func()."""
+    is_tracing = trace_memory and not tracemalloc.is_tracing()
+    if is_tracing:
+        tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            time_start = time.perf_counter()
+            func()
+            seconds = time.perf_counter() - time_start
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if is_tracing:
+            tracemalloc.stop()
+    return {'seconds': seconds, 'peak_memory': peak_memory, 'queries': len(queries)}
+
+
+def compare_results(results, baseline, threshold, min_seconds=0.05):
+    """
+    Regressions of results against the baseline ones with the same size and name, as (result, metric, baseline
+    value) for metrics grown by more than threshold (0.2 is 20%). Timings shorter than min_seconds are noise.
+    """
+    baseline = {(result['size'], result['name']): result for result in baseline}
+    regressions = []
+    for result in results:
+        result_baseline = baseline.get((result['size'], result['name']))
+        if result_baseline is None:
+            continue
+        for metric in METRICS:
+            value, value_baseline = result.get(metric), result_baseline.get(metric)
+            if value is None or value_baseline is None:
+                continue
+            if metric == 'seconds' and value < min_seconds:
+                continue
+            if value > value_baseline * (1 + threshold):
+                regressions.append((result, metric, value_baseline))
+    return regressions
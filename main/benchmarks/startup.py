@@ -0,0 +1,41 @@
+"""
+Startup of a command: django.setup() (models, admin and signals imports) and the system checks, run in a new
+process by "python -m main.benchmarks.startup <database name> [--trace-memory]", printing its measure as JSON.
+"""
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+
+def main():
+    database_name, *flags = sys.argv[1:]
+    is_trace_memory = '--trace-memory' in flags
+    if is_trace_memory:
+        tracemalloc.start()
+    time_start = time.perf_counter()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'base.settings')
+
+    import django
+
+    from django.conf import settings
+    from django.db import connection
+
+    settings.DATABASES['default']['NAME'] = database_name
+    connection.force_debug_cursor = True
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command('check', stdout=io.StringIO())
+    print(json.dumps({
+        'seconds': time.perf_counter() - time_start,
+        'peak_memory': tracemalloc.get_traced_memory()[1] if is_trace_memory else None,
+        'queries': len(connection.queries)
+    }))
+
+
+if __name__ == '__main__':
+    main()
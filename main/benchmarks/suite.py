@@ -0,0 +1,135 @@
+import json
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from main.benchmarks.measure import measure
+from main.models import Character, CharacterRelationship, EventLog, Place, PlaceTransition, Plan
+from main.signals import clear_cache_post_save
+from main.world import WorldGenerator, save_world
+
+CHANGELIST_MODELS = (Character, Place, Plan, EventLog, CharacterRelationship, PlaceTransition)
+CHANGE_FORM_MODELS = (Character, Place, Plan)
+
+
+@contextmanager
+def benchmark_database():
+    """Runs inside a new test database, the configured one is restored on exit."""
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def run_command(name, **options):
+    call_command(name, stdout=StringIO(), stderr=StringIO(), **options)
+
+
+def generate_world(size, seed):
+    """A world of size characters without homes, they are left to the build_homes benchmark."""
+    rows = WorldGenerator(size, homes=False, seed=seed).generate()
+    with transaction.atomic():
+        save_world(rows)
+
+
+def get_admin_page(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise AssertionError(f'{url} returned {response.status_code}')
+
+
+def get_startup_database(directory):
+    """Name of the test database for a new process, in-memory SQLite databases are copied to a file."""
+    if connection.vendor != 'sqlite' or not connection.is_in_memory_db():
+        return connection.settings_dict['NAME']
+    path = Path(directory) / 'startup.sqlite3'
+    connection.ensure_connection()
+    database = sqlite3.connect(path)
+    try:
+        connection.connection.backup(database)
+    finally:
+        database.close()
+    return str(path)
+
+
+def measure_startup(database_name, trace_memory=True):
+    """Measure of main.benchmarks.startup, a new process has no imports to reuse."""
+    process = subprocess.run(
+        [sys.executable, '-m', 'main.benchmarks.startup', database_name, *(['--trace-memory'] if trace_memory else [])],
+        cwd=settings.BASE_DIR,
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True
+    )
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def get_benchmarks(size, seed, client):
+    """
+    (name, func) in the running order, later ones run on the data built by the earlier ones. Change forms are of the
+    last objects, the first plans are hidden from the admin.
+    """
+    benchmarks = [
+        ('generate_world', lambda: generate_world(size, seed)),
+        ('build_homes', lambda: run_command('build_homes', seed=seed)),
+        ('build_relationships', lambda: run_command('build_relationships')),
+        ('update_population', lambda: run_command('update_population')),
+        ('cache_warmup', clear_cache_post_save),
+        ('db_to_json', lambda: run_command('db_to_json')),
+    ]
+    for model in CHANGELIST_MODELS:
+        model_name = model._meta.model_name  # noqa
+        url = reverse(f'admin:main_{model_name}_changelist')
+        benchmarks.append((f'admin_{model_name}_changelist', lambda url=url: get_admin_page(client, url)))
+    for model in CHANGE_FORM_MODELS:
+        model_name = model._meta.model_name  # noqa
+        benchmarks.append((f'admin_{model_name}_change', lambda model=model, model_name=model_name: get_admin_page(
+            client, reverse(f'admin:main_{model_name}_change', args=[model.objects.order_by('-id').first().id])
+        )))
+    return benchmarks
+
+
+def run_benchmarks(sizes, names=None, seed=0, trace_memory=True, log=None):
+    """
+    Results of the benchmarks for every world size (characters count) as {size, name, seconds, peak_memory,
+    queries}, names limits the measured benchmarks, the skipped ones still run to build the data.
+    """
+    results = []
+    with benchmark_database(), tempfile.TemporaryDirectory() as export_dir, override_settings(
+        EXPORT_DIR=Path(export_dir)
+    ):
+        client = Client()
+        for size in sizes:
+            run_command('flush', interactive=False)
+            clear_cache_post_save()
+            client.force_login(User.objects.create_superuser('benchmark'))
+            for name, func in get_benchmarks(size, seed, client):
+                if names and name not in names:
+                    func()
+                    continue
+                results.append({'size': size, 'name': name, **measure(func, trace_memory=trace_memory)})
+                if log:
+                    log(results[-1])
+            if not names or 'startup' in names:
+                database_name = get_startup_database(export_dir)
+                results.append({'size': size, 'name': 'startup', **measure_startup(database_name, trace_memory)})
+                if log:
+                    log(results[-1])
+    return results
@@ -0,0 +1,155 @@
+import numpy as np
+
+from main.models import (
+    Character,
+    CharacterRelationship,
+    Place,
+    Settlement,
+    char_attrs_ranged,
+    char_fields,
+    settlement_fields
+)
+from main.modifiers import compile_modifiers
+
+NEEDS_ATTRS = ('energy', 'sleep', 'mood', 'health')
+PLACE_ATTRS = ('beauty', 'safety', 'fertility')
+RELATIONSHIP_MIN = 100
+RELATIONSHIP_MAX = 1000
+
+
+def get_distribution(values):
+    if not len(values):
+        return {}
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {
+        'min': float(values.min()),
+        'p10': float(p10),
+        'median': float(p50),
+        'mean': round(float(values.mean()), 2),
+        'p90': float(p90),
+        'max': float(values.max()),
+    }
+
+
+def get_changes(before, after):
+    return {
+        'before': get_distribution(before),
+        'after': get_distribution(after),
+        'changed': int((before != after).sum()),
+    }
+
+
+def apply_effect(before, deltas, value_max, value_range, is_rounded=True):
+    """
+    New values after adding deltas: increasing stops at value_max (values already above it are kept),
+    then values are clipped to the field validators range and rounded as stored fields are integers.
+    Repeated applications pass is_rounded=False, small deltas would be rounded away every time.
+    """
+    after = before + deltas
+    if value_max is not None:
+        after = np.where(deltas > 0, np.minimum(after, np.maximum(before, value_max)), after)
+    min_value, max_value = value_range
+    after = np.clip(after, min_value, max_value)
+    return np.rint(after) if is_rounded else after
+
+
+def get_numeric_effects(effects, data_fields):
+    return {
+        attr: value for attr, value in effects.items()
+        if attr in data_fields and isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+
+def get_effect_factors(effects, own_stats, other_stats, place_stats):
+    """Effects modifiers from character attrs (scaled by effects_mods_value) and from place attrs."""
+    factors = np.ones(len(own_stats))
+    if effects.effects_mods:
+        mods = compile_modifiers(effects.effects_mods).evaluate(own_stats, other_stats)
+        mods_value = 1 if effects.effects_mods_value is None else effects.effects_mods_value
+        factors *= 1 + (mods - 1) * mods_value
+    if effects.effects_place_mods:
+        has_place = ~np.isnan(place_stats[:, 0])
+        mods = compile_modifiers(effects.effects_place_mods, PLACE_ATTRS).evaluate(np.nan_to_num(place_stats))
+        factors *= np.where(has_place, mods, 1)
+    return factors
+
+
+def get_settlements_changes(settlement_ids, effects, effects_max):
+    """Every character applies the effects to its settlement once."""
+    effects = get_numeric_effects(effects, settlement_fields)
+    rows = list(Settlement.objects.filter(
+        id__in=set(settlement_ids.tolist()) - {0}
+    ).order_by(
+        'id'
+    ).values_list(
+        'id', *effects
+    )) if effects else []
+    if not rows:
+        return {}
+    data = np.array(rows, dtype=np.float64)
+    settlement_ids = settlement_ids[np.isin(settlement_ids, data[:, 0])]
+    counts = np.bincount(np.searchsorted(data[:, 0], settlement_ids), minlength=len(rows))
+    changes = {}
+    for i, (attr, delta) in enumerate(effects.items(), 1):
+        value_range = (settlement_fields[attr]['min'], settlement_fields[attr]['max'])
+        after = apply_effect(data[:, i], delta * counts, effects_max.get(attr), value_range)
+        changes[attr] = get_changes(data[:, i], after)
+    return changes
+
+
+def preview_effects(effects, chars=None, other_char=None):
+    """
+    Before/after distributions of one CharacterDataEffects applied once to every character of chars
+    (all by default), own/other modifiers use other_char or the character itself. Nothing is saved.
+    """
+    chars = Character.objects.all() if chars is None else chars
+    char_effects = get_numeric_effects(effects.effects, char_fields)
+    attrs = tuple(dict.fromkeys([*char_attrs_ranged, *char_effects]))
+    rows = list(chars.order_by('id').values_list('id', 'place_id', 'settlement_id', *attrs))
+    if not rows:
+        return {'characters': 0}
+    data = np.array([[np.nan if v is None else v for v in row] for row in rows], dtype=np.float64)
+    ids = data[:, 0].astype(np.int64)
+    place_ids = np.nan_to_num(data[:, 1]).astype(np.int64)
+    settlement_ids = np.nan_to_num(data[:, 2]).astype(np.int64)
+    stats = data[:, 3:]
+    own_stats = stats[:, :len(char_attrs_ranged)]
+    other_stats = None
+    if other_char:
+        other_stats = np.array([getattr(other_char, attr) for attr in char_attrs_ranged], dtype=np.float64)
+
+    chars_places = Place.objects.filter(id__in=chars.values('place_id'))
+    places = {row[0]: row[1:] for row in chars_places.values_list('id', *PLACE_ATTRS)}
+    empty = (np.nan,) * len(PLACE_ATTRS)
+    place_stats = np.array([places.get(place_id, empty) for place_id in place_ids.tolist()], dtype=np.float64)
+    factors = get_effect_factors(effects, own_stats, other_stats, place_stats)
+
+    result = {'characters': len(ids), 'factors': get_distribution(factors), 'attrs': {}}
+    for attr, delta in char_effects.items():
+        before = stats[:, attrs.index(attr)]
+        deltas = delta * factors * (effects.needs_mods.get(attr, 1) if attr in NEEDS_ATTRS else 1)
+        value_range = (char_fields[attr]['min'], char_fields[attr]['max'])
+        after = apply_effect(before, deltas, effects.effects_max.get(attr), value_range)
+        result['attrs'][attr] = get_changes(before, after)
+
+    result['settlements'] = get_settlements_changes(
+        settlement_ids, effects.settlement_effects, effects.settlement_effects_max
+    )
+    places_settlements = dict(chars_places.filter(settlement__isnull=False).values_list('id', 'settlement_id'))
+    result['place_settlements'] = get_settlements_changes(
+        np.array([places_settlements.get(place_id, 0) for place_id in place_ids.tolist()], dtype=np.int64),
+        effects.place_settlement_effects,
+        effects.place_settlement_effects_max
+    )
+
+    if effects.relationships_effects:
+        before = np.array(list(CharacterRelationship.objects.filter(
+            from_character__in=chars
+        ).values_list('value', flat=True)), dtype=np.float64)
+        after = before + effects.relationships_effects
+        if effects.relationships_effects > 0:
+            after = np.minimum(after, np.maximum(before, effects.relationships_effects_max or RELATIONSHIP_MAX))
+        else:
+            after = np.maximum(after, np.minimum(before, effects.relationships_effects_min or RELATIONSHIP_MIN))
+        result['relationships'] = get_changes(before, np.rint(np.clip(after, RELATIONSHIP_MIN, RELATIONSHIP_MAX)))
+    return result
@@ -0,0 +1,98 @@
+import base64
+
+import numpy as np
+
+from django.db.models import IntegerField
+
+from main.filters import FilterContext, compile_filter, get_filter_groups
+from main.models import Character, Faction, Plan
+from main.utils import PLAYER_ID, parse_filter
+
+STATE_RELATIONS = {'place', 'plan_data', 'settlement', 'position'}
+
+
+def get_dynamic_char_fields():
+    """Character fields changed by effects (integer attrs) or by the game state (place, plan, position)."""
+    fields = {'relationship'}
+    for field in Character._meta.fields:  # noqa
+        if isinstance(field, IntegerField) and field.name != 'id' or field.name in STATE_RELATIONS:
+            fields.update({field.name, field.attname})
+    return fields
+
+
+def is_static_item(lookup, value, dynamic_fields):
+    if isinstance(value, str) and value.startswith('_'):
+        return False
+    if isinstance(value, list) and any(isinstance(v, str) and v.startswith('_') for v in value):
+        return False
+    relations, field_name, _ = parse_filter(lookup)
+    return (relations[0] if relations else field_name) not in dynamic_fields and '_set' not in lookup
+
+
+def get_static_filters(filters, dynamic_fields):
+    """
+    Part of character filters not depending on the game state, it passes every character passing filters:
+    dynamic items are dropped, OR groups are dropped whole if any alternative has a dynamic item.
+    """
+    items, or_groups = get_filter_groups(filters)
+    static_filters = {lookup: value for lookup, value in items if is_static_item(lookup, value, dynamic_fields)}
+    for alternatives in or_groups:
+        group_items = [item for alternative in alternatives for item in alternative]
+        if all(is_static_item(lookup, value, dynamic_fields) for lookup, value in group_items):
+            static_filters.update(group_items)
+    return static_filters
+
+
+def get_plan_char_filters(plan, char_key):
+    """Character filters of the plan and its first stage for "first_character" or "second_character"."""
+    filters = []
+    for plan_filters in (plan.filters, plan.one.filters):
+        char_filters = getattr(plan_filters, char_key) if plan_filters else None
+        if char_filters and char_filters.filters:
+            filters.append(char_filters.filters)
+    return filters
+
+
+def get_eligibility(chars, plans):
+    """
+    Static eligibility bits of characters as first and second character of every plan:
+    {plan id: {'first': bool array, 'second': bool array or None if plan has no second character filters}}.
+    Plan points (min_points) depend on the state and are not included.
+    """
+    dynamic_fields = get_dynamic_char_fields()
+    context = FilterContext(related={'faction': {faction['id']: faction for faction in Faction.objects.values()}})
+    is_player = np.array([char['id'] == PLAYER_ID for char in chars], dtype=bool)
+    data = {}
+    for plan in plans:
+        first = np.where(is_player, plan.is_player_available, plan.is_char_available)
+        for filters in get_plan_char_filters(plan, 'first_character'):
+            first &= get_filter_bits(get_static_filters(filters, dynamic_fields), chars, context)
+        second = None
+        for filters in get_plan_char_filters(plan, 'second_character'):
+            bits = get_filter_bits(get_static_filters(filters, dynamic_fields), chars, context)
+            second = bits if second is None else second & bits
+        data[plan.id] = {'first': first, 'second': second}
+    return data
+
+
+def get_filter_bits(filters, chars, context):
+    if not filters:
+        return np.ones(len(chars), dtype=bool)
+    predicate = compile_filter(filters)
+    return np.fromiter((predicate(char, context) for char in chars), dtype=bool, count=len(chars))
+
+
+def load_chars():
+    return list(Character.objects.order_by('id').values())
+
+
+def load_plans():
+    return list(Plan.objects.select_related(
+        'filters__first_character', 'filters__second_character', 'one__filters__first_character',
+        'one__filters__second_character'
+    ).order_by('id'))
+
+
+def pack_bits(bits):
+    """Bit i is the character i, decoded with int.from_bytes(base64.b64decode(value), 'little')."""
+    return base64.b64encode(np.packbits(bits, bitorder='little').tobytes()).decode()
@@ -0,0 +1,198 @@
+import json
+import re
+import zlib
+
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+
+from main.models import Character, EventLog, EventLogArchive, EventRollup, Place, Plan
+
+EVENT_RELATIONS = {
+    'plan': Plan,
+    'first_character': Character,
+    'second_character': Character,
+    'place': Place,
+}
+SEPARATORS_RE = re.compile(r'[\s,]*')
+ARCHIVE_FIELDS = (
+    'id', 'timestamp', 'plan_id', 'first_character_id', 'second_character_id', 'place_id', 'is_important'
+)
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """Items of a JSON array file without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('JSON array expected')
+    pos = 1
+    is_eof = False
+    while True:
+        pos = SEPARATORS_RE.match(buffer, pos).end()
+        if buffer[pos:pos + 1] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            # an item ending with the buffer may continue in the next chunk (numbers)
+            if end < len(buffer) or is_eof:
+                yield item
+                pos = end
+                continue
+        except json.JSONDecodeError:
+            if is_eof:
+                raise
+        chunk = f.read(chunk_size)
+        is_eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def iter_json_lines(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_events(f, is_lines=None):
+    """Events of a JSON lines file or a JSON array file, detected by the first character if is_lines is not set."""
+    if is_lines is None:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        is_lines = first != '['
+        f.seek(0)
+    return iter_json_lines(f) if is_lines else iter_json_array(f)
+
+
+class EventsResolver:
+    """
+    Ids of event relations, an event value is an id or a unique title: {"plan": "relax", "first_character": 2}.
+    "<relation>_id" keys are accepted too, not found relations are saved as null and counted.
+    """
+    def __init__(self):
+        self.ids = {}
+        self.titles = {}
+        for model in set(EVENT_RELATIONS.values()):
+            rows = list(model.objects.values_list('id', 'title'))
+            self.ids[model] = {row_id for row_id, _ in rows}
+            self.titles[model] = {title: row_id for row_id, title in rows}
+        self.unresolved_count = 0
+
+    def get_id(self, model, value):
+        if value is None:
+            return None
+        row_id = self.titles[model].get(value) if isinstance(value, str) else value
+        if row_id not in self.ids[model]:
+            self.unresolved_count += 1
+            return None
+        return row_id
+
+    def get_event(self, data):
+        kwargs = {
+            f'{name}_id': self.get_id(model, data.get(name, data.get(f'{name}_id')))
+            for name, model in EVENT_RELATIONS.items()
+        }
+        return EventLog(timestamp=data['timestamp'], is_important=bool(data.get('is_important')), **kwargs)
+
+
+def iter_batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def get_rollups_counts(events):
+    """Counter of (dimension, key) of the events plans, first characters, places and hours."""
+    counts = Counter()
+    for event in events:
+        counts[('hour', event.timestamp // 3600)] += 1
+        for dimension, key in (
+            ('plan', event.plan_id), ('character', event.first_character_id), ('place', event.place_id)
+        ):
+            if key:
+                counts[(dimension, key)] += 1
+    return counts
+
+
+def add_rollups_counts(counts, chunk_size=5000):
+    for chunk in iter_batches(counts.items(), chunk_size):
+        chunk_counts = dict(chunk)
+        keys = {}
+        for dimension, key in chunk_counts:
+            keys.setdefault(dimension, []).append(key)
+        query = Q()
+        for dimension, dimension_keys in keys.items():
+            query |= Q(dimension=dimension, key__in=dimension_keys)
+        rollups_update = []
+        for rollup in EventRollup.objects.filter(query):
+            rollup.count += chunk_counts.pop((rollup.dimension, rollup.key))
+            rollups_update.append(rollup)
+        EventRollup.objects.bulk_update(rollups_update, ['count'])
+        EventRollup.objects.bulk_create([
+            EventRollup(dimension=dimension, key=key, count=count) for (dimension, key), count in chunk_counts.items()
+        ])
+
+
+def update_rollups(events):
+    """Adds events to plan, character, place and hour counts."""
+    add_rollups_counts(get_rollups_counts(events))
+
+
+def import_events(events_data, resolver, batch_size=5000, transaction_size=100000):
+    """
+    Saves events in bulk batches with their rollups, every transaction_size events are committed together.
+    Returns events count.
+    """
+    count = 0
+    batches = iter_batches(events_data, batch_size)
+    batches_per_transaction = max(1, transaction_size // batch_size)
+    while True:
+        with transaction.atomic():
+            saved_count = count
+            for batch in islice(batches, batches_per_transaction):
+                events = EventLog.objects.bulk_create([resolver.get_event(data) for data in batch])
+                update_rollups(events)
+                count += len(events)
+        if count == saved_count:
+            return count
+
+
+def archive_events(before, chunk_size=5000, on_chunk=None):
+    """
+    Moves events older than before (in-game seconds) to EventLogArchive chunks or to on_chunk(rows) if set.
+    Rollups keep counting archived events. Returns archived events count.
+    """
+    count = 0
+    while True:
+        with transaction.atomic():
+            rows = list(EventLog.objects.filter(
+                timestamp__lt=before
+            ).order_by(
+                'timestamp', 'id'
+            ).values_list(
+                *ARCHIVE_FIELDS
+            )[:chunk_size])
+            if not rows:
+                return count
+            if on_chunk:
+                on_chunk(rows)
+            else:
+                EventLogArchive.objects.create(
+                    from_timestamp=rows[0][1],
+                    to_timestamp=rows[-1][1],
+                    count=len(rows),
+                    data=zlib.compress(json.dumps(rows).encode())
+                )
+            EventLog.objects.filter(id__in=[row[0] for row in rows]).delete()
+            count += len(rows)
+
+
+def load_archive(archive):
+    return [dict(zip(ARCHIVE_FIELDS, row)) for row in json.loads(zlib.decompress(archive.data))]
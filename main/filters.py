@@ -0,0 +1,235 @@
+import json
+import operator
+import re
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count, OuterRef, Q, Subquery, Value, Window
+from django.db.models.functions import Coalesce
+
+from main.models import CharacterRelationship
+from main.utils import parse_filter
+
+OR_SUFFIX_RE = re.compile(r'__or([0-9])?(a)?([0-9])?$')
+SECOND_CHAR_PREFIX = '_second_char'
+
+
+def compare_not_none(compare):
+    return lambda a, b: a is not None and b is not None and compare(a, b)
+
+
+OPERATORS = {
+    'exact': operator.eq,
+    'ne': operator.ne,
+    'gt': compare_not_none(operator.gt),
+    'gte': compare_not_none(operator.ge),
+    'lt': compare_not_none(operator.lt),
+    'lte': compare_not_none(operator.le),
+    'in': lambda a, b: a in b,
+    'nin': lambda a, b: a not in b,
+    'isnull': lambda a, b: (a is None) == bool(b),
+}
+
+
+class FilterContext:
+    """
+    Values for placeholders and relations of in-memory objects:
+    "_id", "_place_id" etc. are taken from char, "_second_char_id" etc. from second_char,
+    related is {relation name: {id: object}} used for dicts (exported objects) having only "<relation>_id",
+    relationships is {(from_id, to_id): value} used for "relationship" field (char to filtered object).
+    """
+    def __init__(self, char=None, second_char=None, related=None, relationships=None):
+        self.char = char
+        self.second_char = second_char
+        self.related = related or {}
+        self.relationships = relationships or {}
+
+
+EMPTY_CONTEXT = FilterContext()
+
+
+def get_attr(obj, name, context):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        if name in obj:
+            return obj[name]
+        related_id = obj.get(f'{name}_id')
+        if related_id is None:
+            return None
+        return context.related.get(name, {}).get(related_id)
+    return getattr(obj, name, None)
+
+
+def get_values(obj, path, context):
+    """All values on the path, relations ending with "_set" are one to many."""
+    objects = [obj]
+    for name in path:
+        values = []
+        for item in objects:
+            value = get_attr(item, name, context)
+            if name.endswith('_set') and value is not None:
+                values.extend(value.all() if hasattr(value, 'all') else value)
+            else:
+                values.append(value)
+        objects = values
+    return objects
+
+
+def compile_value(value):
+    """Getter of the expected value from the context."""
+    if isinstance(value, str) and value.startswith('_'):
+        if value.startswith(SECOND_CHAR_PREFIX):
+            name = value[len(SECOND_CHAR_PREFIX) + 1:]
+            return lambda context: get_attr(context.second_char, name, context)
+        name = value[1:]
+        return lambda context: get_attr(context.char, name, context)
+    if isinstance(value, list) and any(isinstance(v, str) and v.startswith('_') for v in value):
+        getters = [compile_value(v) for v in value]
+        return lambda context: [getter(context) for getter in getters]
+    return lambda _: value
+
+
+def compile_term(lookup, value):
+    relations, field_name, cmd = parse_filter(lookup)
+    compare = OPERATORS[cmd]
+    get_expected = compile_value(value)
+
+    if field_name == 'relationship' and not relations:
+        default = settings.RELATIONSHIPS_DEFAULT_VALUE or 500
+
+        def term(obj, context):
+            char_id = get_attr(context.char, 'id', context)
+            actual = context.relationships.get((char_id, get_attr(obj, 'id', context)), default)
+            return compare(actual, get_expected(context))
+        return term
+
+    if not relations:
+        return lambda obj, context: compare(get_attr(obj, field_name, context), get_expected(context))
+
+    path = relations + [field_name]
+    if any(name.endswith('_set') for name in relations):
+        return lambda obj, context: any(
+            compare(actual, get_expected(context)) for actual in get_values(obj, path, context)
+        )
+
+    def term(obj, context):
+        for name in path:
+            obj = get_attr(obj, name, context)
+        return compare(obj, get_expected(context))
+    return term
+
+
+def get_filter_groups(filters):
+    """
+    Items combined with AND and OR groups as lists of alternatives, every alternative is a list of items:
+    items with the same "__or<N>a<M>" suffix make one alternative together, other "__or<N>" items are alternatives
+    alone.
+    """
+    items = []
+    or_groups = {}
+    for lookup, value in filters.items():
+        match = OR_SUFFIX_RE.search(lookup) if '__or' in lookup else None
+        if not match:
+            items.append((lookup, value))
+            continue
+        group, is_and, _ = match.groups()
+        alternatives = or_groups.setdefault(group or '', {})
+        alternatives.setdefault(match.group(0) if is_and else lookup, []).append((lookup, value))
+    return items, [list(alternatives.values()) for alternatives in or_groups.values()]
+
+
+@lru_cache(maxsize=4096)
+def compile_filter_json(filters_json):
+    items, or_groups = get_filter_groups(json.loads(filters_json))
+    terms = [compile_term(lookup, value) for lookup, value in items]
+    or_groups = [
+        [[compile_term(lookup, value) for lookup, value in alternative] for alternative in alternatives]
+        for alternatives in or_groups
+    ]
+
+    def predicate(obj, context=EMPTY_CONTEXT):
+        for term_ in terms:
+            if not term_(obj, context):
+                return False
+        for alternatives_ in or_groups:
+            for alternative in alternatives_:
+                for term_ in alternative:
+                    if not term_(obj, context):
+                        break
+                else:
+                    break
+            else:
+                return False
+        return True
+    return predicate
+
+
+def compile_filter(filters):
+    """Predicate(obj, context=None) for a filters dict, compiled once per unique filters."""
+    return compile_filter_json(json.dumps(filters, sort_keys=True))
+
+
+def evaluate_filter(filters, objects, context=None):
+    predicate = compile_filter(filters)
+    context = context or EMPTY_CONTEXT
+    return [predicate(obj, context) for obj in objects]
+
+
+def filter_objects(filters, objects, context=None):
+    predicate = compile_filter(filters)
+    context = context or EMPTY_CONTEXT
+    return [obj for obj in objects if predicate(obj, context)]
+
+
+def get_term_q(lookup, value, context):
+    relations, field_name, cmd = parse_filter(lookup)
+    value = compile_value(value)(context)
+    path = '__'.join(relations + [field_name])
+    if cmd == 'ne':
+        return ~Q(**{path: value})
+    if cmd == 'nin':
+        return ~Q(**{f'{path}__in': value})
+    if cmd == 'exact':
+        return Q(**{path: value})
+    if value is None and cmd != 'isnull':
+        return Q(pk__in=[])  # comparison with null never matches
+    return Q(**{f'{path}__{cmd}': value})
+
+
+def filter_to_q(filters, char=None, second_char=None):
+    """Q for a filters dict, placeholders are bound to char and second_char."""
+    context = FilterContext(char=char, second_char=second_char)
+    items, or_groups = get_filter_groups(filters)
+    q = Q()
+    for lookup, value in items:
+        q &= get_term_q(lookup, value, context)
+    for alternatives in or_groups:
+        q_alternatives = Q()
+        for alternative in alternatives:
+            q_alternative = Q()
+            for lookup, value in alternative:
+                q_alternative &= get_term_q(lookup, value, context)
+            q_alternatives |= q_alternative
+        q &= q_alternatives
+    return q
+
+
+def filter_queryset(queryset, filters, char=None, second_char=None):
+    if any(parse_filter(lookup)[:2] == ([], 'relationship') for lookup in filters):
+        queryset = queryset.annotate(relationship=Coalesce(
+            Subquery(CharacterRelationship.objects.filter(
+                from_character_id=getattr(char, 'id', None), to_character=OuterRef('pk')
+            ).values('value')[:1]),
+            Value(settings.RELATIONSHIPS_DEFAULT_VALUE or 500)
+        ))
+    return queryset.filter(filter_to_q(filters, char=char, second_char=second_char))
+
+
+def get_filter_preview(queryset, filters, char=None, second_char=None, sample_size=5):
+    """Matches count and first matched objects, with one query."""
+    objects = list(filter_queryset(queryset, filters, char=char, second_char=second_char).annotate(
+        matches_count=Window(Count('pk'))
+    )[:sample_size])
+    return (objects[0].matches_count if objects else 0), objects
@@ -1,5 +1,8 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.http import QueryDict
 
 from main.models import (
     Character,
@@ -20,6 +23,7 @@ from main.models import (
     plan_fields,
     settlement_fields
 )
+from main.signals import clear_cache_post_save
 from main.utils import (
     check_characters_modifiers,
     check_json_keys,
@@ -212,19 +216,109 @@ class PlaceForm(forms.ModelForm):
 class PlaceTransitionFormset(forms.BaseInlineFormSet):
     def save(self, commit=True):
         instances = super().save(commit=False)
-        for instance in instances:
-            instance.save()
-            self.model.objects.update_or_create(
-                from_place_id=instance.to_place_id,
-                to_place_id=instance.from_place_id,
-                defaults={'distance': instance.distance}
-            )
-
-        for obj in self.deleted_objects:
-            obj.delete()
-            self.model.objects.filter(from_place_id=obj.to_place_id, to_place_id=obj.from_place_id).delete()
-
-        self.save_m2m()
+        place_id = self.instance.id
+        distances = {
+            instance.to_place_id: instance.distance for instance in instances if instance.to_place_id != place_id
+        }
+        to_places_removed = [obj.to_place_id for obj in self.deleted_objects] + [
+            form.initial['to_place'] for form in self.forms
+            if form.instance.pk and 'to_place' in form.changed_data and not self._should_delete_form(form)
+        ]
+
+        with transaction.atomic():
+            if to_places_removed:
+                self.model.objects.filter(
+                    Q(id__in=[obj.id for obj in self.deleted_objects]) |
+                    Q(from_place_id__in=to_places_removed, to_place_id=place_id)
+                ).delete()
+
+            reverse_ids = dict(self.model.objects.filter(
+                from_place_id__in=distances, to_place_id=place_id
+            ).values_list(
+                'from_place_id', 'id'
+            ))
+            transitions_create = [instance for instance in instances if not instance.pk]
+            transitions_update = [instance for instance in instances if instance.pk]
+            for to_place_id, distance in distances.items():
+                transition = self.model(from_place_id=to_place_id, to_place_id=place_id, distance=distance)
+                if to_place_id in reverse_ids:
+                    transition.id = reverse_ids[to_place_id]
+                    transitions_update.append(transition)
+                else:
+                    transitions_create.append(transition)
+
+            if transitions_create:
+                self.model.objects.bulk_create(transitions_create)
+            if transitions_update:
+                self.model.objects.bulk_update(transitions_update, ['from_place', 'to_place', 'distance'])
+
+        if instances or to_places_removed:
+            clear_cache_post_save()
+
+
+class CharacterRelationshipFormset(forms.BaseInlineFormSet):
+    """A page of the character relationships, optionally searched by the other character name, saved in bulk."""
+    page = 1
+    page_size = 50
+    search = ''
+    params = None  # request GET params for pages urls
+
+    def get_queryset(self):
+        if not hasattr(self, 'total_count'):
+            queryset = super().get_queryset()
+            if self.search:
+                queryset = queryset.filter(
+                    Q(to_character__first_name__icontains=self.search) |
+                    Q(to_character__last_name__icontains=self.search)
+                )
+            if self.is_bound:
+                # posted rows are found by ids, rows added or removed meanwhile can't shift the page
+                ids = [self.data.get(f'{self.add_prefix(i)}-id') for i in range(self.initial_form_count())]
+                queryset = queryset.filter(id__in=[row_id for row_id in ids if row_id])
+            self.total_count = queryset.count()
+            self.pages_count = max(1, -(-self.total_count // self.page_size))
+            self.page = min(max(1, self.page), self.pages_count)
+            offset = (self.page - 1) * self.page_size
+            self._queryset = queryset.select_related(
+                'from_character', 'to_character'
+            ).order_by(
+                'to_character_id'
+            )[offset:offset + self.page_size]
+        return self._queryset
+
+    @property
+    def pager(self):
+        self.get_queryset()
+        start = (self.page - 1) * self.page_size
+        return {
+            'start': min(start + 1, self.total_count),
+            'end': min(start + self.page_size, self.total_count),
+            'total_count': self.total_count,
+            'search': self.search,
+            'previous_url': self.get_page_url(self.page - 1) if self.page > 1 else None,
+            'next_url': self.get_page_url(self.page + 1) if self.page < self.pages_count else None,
+        }
+
+    def get_page_url(self, page):
+        params = self.params.copy() if self.params is not None else QueryDict(mutable=True)
+        params['rel_page'] = page
+        return f'?{params.urlencode()}'
+
+    def save(self, commit=True):
+        instances = super().save(commit=False)
+        relationships_create = [instance for instance in instances if not instance.pk]
+        relationships_update = [instance for instance in instances if instance.pk]
+        with transaction.atomic():
+            if self.deleted_objects:
+                self.model.objects.filter(id__in=[obj.id for obj in self.deleted_objects]).delete()
+            if relationships_create:
+                self.model.objects.bulk_create(relationships_create)
+            if relationships_update:
+                self.model.objects.bulk_update(relationships_update, ['to_character', 'value'])
+
+        if instances or self.deleted_objects:
+            clear_cache_post_save()
+        return instances
 
 
 class SettlementPositionForm(forms.ModelForm):
@@ -0,0 +1,420 @@
+import heapq
+
+from array import array
+from collections import defaultdict
+from math import inf
+
+import numpy as np
+
+from main.models import Place, PlaceTransition
+
+ROUTES_CACHE_MAX = 100000
+
+_graph = None
+_index = None
+
+
+def get_csr(size, from_indexes, to_indexes, distances):
+    """Compressed adjacency arrays (offsets, targets, distances) of the edges grouped by from index."""
+    order = np.argsort(from_indexes, kind='stable')
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(from_indexes, minlength=size), out=offsets[1:])
+    return (
+        array('q', offsets.tobytes()),
+        array('q', to_indexes[order].tobytes()),
+        array('d', distances[order].tobytes())
+    )
+
+
+def get_route(start_id, target_ids):
+    return {
+        'start_place_id': start_id,
+        'is_targeted': len(target_ids) == 1,
+        'route_distance': 0.0,
+        'places': {},
+        'status': 'not_found'
+    }
+
+
+def get_cluster(place_id, settlement_id, owner_id):
+    if owner_id:
+        return 'home', owner_id
+    if settlement_id:
+        return 'settlement', settlement_id
+    return 'place', place_id
+
+
+class PlaceGraph:
+    """
+    Places graph built from PlaceTransition rows.
+    Places are addressed by ids outside and by positions in `ids` inside, the transitions are stored in CSR arrays.
+    """
+    def __init__(self, ids, transitions, locked_ids=(), clusters=None):
+        self.ids = list(ids)
+        self.indexes = {place_id: i for i, place_id in enumerate(self.ids)}
+        self.locked_ids = frozenset(locked_ids)
+        self.clusters = clusters or {}
+        transitions = list(transitions)
+        from_indexes = np.array([self.indexes[t[0]] for t in transitions], dtype=np.int64)
+        to_indexes = np.array([self.indexes[t[1]] for t in transitions], dtype=np.int64)
+        distances = np.array([t[2] for t in transitions], dtype=np.float64)
+        self.offsets, self.targets, self.distances = get_csr(len(self.ids), from_indexes, to_indexes, distances)
+        self.reverse_offsets, self.reverse_targets, self.reverse_distances = get_csr(
+            len(self.ids), to_indexes, from_indexes, distances
+        )
+        self.landmarks = []
+        self.routes = {}
+
+    @classmethod
+    def load(cls):
+        places = list(Place.objects.order_by('id').values_list('id', 'is_locked', 'settlement_id', 'owner_id'))
+        transitions = PlaceTransition.objects.values_list('from_place_id', 'to_place_id', 'distance')
+        return cls(
+            [place_id for place_id, *_ in places],
+            transitions,
+            [place_id for place_id, is_locked, *_ in places if is_locked],
+            {
+                place_id: get_cluster(place_id, settlement_id, owner_id)
+                for place_id, _, settlement_id, owner_id in places
+            }
+        )
+
+    def get_blocked(self, is_locked):
+        """Indexes of places is_locked closes, only locked places are checked."""
+        if is_locked is None:
+            return None
+        return {
+            self.indexes[place_id] for place_id in self.locked_ids if place_id in self.indexes and is_locked(place_id)
+        }
+
+    def get_distances(self, start_index, blocked=None, max_distance=None, is_reverse=False):
+        """Distances from (or to, if reverse) the start to every place, inf for unreachable ones."""
+        offsets, targets, distances = (
+            (self.reverse_offsets, self.reverse_targets, self.reverse_distances) if is_reverse else
+            (self.offsets, self.targets, self.distances)
+        )
+        result = [inf] * len(self.ids)
+        result[start_index] = 0.0
+        heap = [(0.0, start_index)]
+        while heap:
+            distance, index = heapq.heappop(heap)
+            if distance > result[index]:
+                continue
+            for i in range(offsets[index], offsets[index + 1]):
+                target = targets[i]
+                if blocked and target in blocked:
+                    continue
+                target_distance = distance + distances[i]
+                if max_distance is not None and target_distance > max_distance:
+                    continue
+                if target_distance < result[target]:
+                    result[target] = target_distance
+                    heapq.heappush(heap, (target_distance, target))
+        return result
+
+    def build_landmarks(self, count=4):
+        """Landmarks for A* (ALT) heuristic, picked as farthest places from already chosen ones."""
+        self.landmarks = []
+        self.routes = {}
+        if not self.ids:
+            return
+        nearest = [inf] * len(self.ids)
+        landmark = 0
+        for _ in range(min(count, len(self.ids))):
+            distances_from = self.get_distances(landmark)
+            distances_to = self.get_distances(landmark, is_reverse=True)
+            self.landmarks.append((distances_from, distances_to))
+            nearest = [min(a, b) for a, b in zip(nearest, distances_from)]
+            reachable = [(d, i) for i, d in enumerate(nearest) if d != inf]
+            landmark = max(reachable)[1]
+
+    def get_heuristic(self, target_index):
+        if not self.landmarks:
+            return None
+
+        def heuristic(index):
+            value = 0.0
+            for distances_from, distances_to in self.landmarks:
+                if distances_from[target_index] != inf and distances_from[index] != inf:
+                    value = max(value, distances_from[target_index] - distances_from[index])
+                if distances_to[index] != inf and distances_to[target_index] != inf:
+                    value = max(value, distances_to[index] - distances_to[target_index])
+            return value
+
+        return heuristic
+
+    def search(self, start_index, targets, blocked=None, max_distance=None):
+        """Dijkstra to the nearest of targets, A* if there is a single target and landmarks are built."""
+        heuristic = self.get_heuristic(next(iter(targets))) if len(targets) == 1 else None
+        best = {start_index: 0.0}
+        previous = {}
+        heap = [(0.0, 0.0, start_index)]
+        while heap:
+            _, distance, index = heapq.heappop(heap)
+            if distance > best[index]:
+                continue
+            if index in targets:
+                path = [index]
+                while path[-1] in previous:
+                    path.append(previous[path[-1]])
+                return distance, path[::-1]
+            for i in range(self.offsets[index], self.offsets[index + 1]):
+                target = self.targets[i]
+                if blocked and target in blocked:
+                    continue
+                target_distance = distance + self.distances[i]
+                if max_distance is not None and target_distance > max_distance:
+                    continue
+                if target_distance < best.get(target, inf):
+                    best[target] = target_distance
+                    previous[target] = index
+                    priority = target_distance + heuristic(target) if heuristic else target_distance
+                    heapq.heappush(heap, (priority, target_distance, target))
+        return None
+
+    def find_route(self, start_id, target_ids, is_locked=None, lock_key=None, max_distance=None):
+        """
+        Route from start to the nearest of target places, as Route fields:
+        places is {place_id: distance from start} in the route order.
+        is_locked(place_id) tells if a locked place (Place.is_locked) can't be entered, other places are always open,
+        results are cached only with lock_key. Use `graph.locked_ids.__contains__` to keep all locked places closed.
+        """
+        target_ids = frozenset([target_ids] if isinstance(target_ids, int) else target_ids)
+        cache_key = (start_id, target_ids, lock_key, max_distance)
+        if (is_locked is None or lock_key is not None) and cache_key in self.routes:
+            return self.routes[cache_key]
+
+        route = get_route(start_id, target_ids)
+        targets = {self.indexes[place_id] for place_id in target_ids if place_id in self.indexes}
+        if start_id in self.indexes and targets:
+            start_index = self.indexes[start_id]
+            found = self.search(start_index, targets, self.get_blocked(is_locked), max_distance)
+            if found:
+                self.set_route_path(route, found[1])
+            elif is_locked is not None and self.search(start_index, targets, None, max_distance):
+                route['status'] = 'locked'
+
+        if is_locked is None or lock_key is not None:
+            if len(self.routes) >= ROUTES_CACHE_MAX:
+                self.routes = {}
+            self.routes[cache_key] = route
+        return route
+
+    def set_route_path(self, route, path):
+        distances = [0.0]
+        for from_index, to_index in zip(path, path[1:]):
+            distances.append(distances[-1] + self.get_distance(from_index, to_index))
+        route.update({
+            'route_distance': distances[-1],
+            'places': {self.ids[i]: d for i, d in zip(path, distances)},
+            'status': 'in_progress'
+        })
+
+    def get_neighbours(self, place_id):
+        index = self.indexes[place_id]
+        return [self.ids[self.targets[i]] for i in range(self.offsets[index], self.offsets[index + 1])]
+
+    def get_distance(self, from_index, to_index):
+        return min(
+            self.distances[i] for i in range(self.offsets[from_index], self.offsets[from_index + 1])
+            if self.targets[i] == to_index
+        )
+
+
+class HierarchicalIndex:
+    """
+    Routing index for large worlds, settlements and homes are contracted to their portals:
+    places with transitions to other clusters and locked places.
+    Portal to portal distances inside clusters are precomputed, so a query searches place by place
+    only inside the clusters of the route ends and jumps between portals elsewhere.
+    is_locked is checked for locked places only.
+    """
+    def __init__(self, graph):
+        self.graph = None
+        self.signatures = {}
+        self.clusters_portals = {}
+        self.shortcuts = {}
+        self.update(graph)
+
+    def update(self, graph):
+        """Use the new graph, shortcuts are rebuilt only for clusters with changed transitions, returns them."""
+        self.graph = graph
+        self.routes = {}
+        self.clusters = [graph.clusters.get(place_id, ('place', place_id)) for place_id in graph.ids]
+        members = defaultdict(list)
+        for i, cluster in enumerate(self.clusters):
+            members[cluster].append(i)
+
+        self.portals = {graph.indexes[place_id] for place_id in graph.locked_ids if place_id in graph.indexes}
+        self.portal_edges = defaultdict(list)
+        for i in range(len(graph.ids)):
+            for k in range(graph.offsets[i], graph.offsets[i + 1]):
+                j = graph.targets[k]
+                if self.clusters[i] != self.clusters[j]:
+                    self.portals.update((i, j))
+                    self.portal_edges[graph.ids[i]].append((graph.ids[j], graph.distances[k]))
+
+        signatures = {}
+        for cluster, indexes in members.items():
+            signatures[cluster] = (
+                tuple(
+                    (graph.ids[i], graph.ids[graph.targets[k]], graph.distances[k])
+                    for i in indexes for k in range(graph.offsets[i], graph.offsets[i + 1])
+                ),
+                tuple(graph.ids[i] for i in indexes if i in self.portals),
+                tuple(graph.ids[i] for i in indexes if graph.ids[i] in graph.locked_ids)
+            )
+        changed = [cluster for cluster in signatures if self.signatures.get(cluster) != signatures[cluster]]
+        for cluster in set(self.signatures) - set(signatures):
+            for portal_id in self.clusters_portals.pop(cluster, ()):
+                self.shortcuts.pop(portal_id, None)
+        for cluster in changed:
+            for portal_id in self.clusters_portals.get(cluster, ()):
+                self.shortcuts.pop(portal_id, None)
+            self.clusters_portals[cluster] = signatures[cluster][1]
+            for portal_id in self.clusters_portals[cluster]:
+                distances, previous = self.search_cluster(graph.indexes[portal_id])
+                self.shortcuts[portal_id] = [
+                    (graph.ids[i], distance, [graph.ids[j] for j in get_path(previous, i)][1:])
+                    for i, distance in distances.items() if i in self.portals and graph.ids[i] != portal_id
+                ]
+        self.signatures = signatures
+        return changed
+
+    def search_cluster(self, start_index, blocked=None, is_reverse=False, max_distance=None, allowed=None):
+        """Dijkstra inside the start cluster, portals are reached but not expanded."""
+        graph = self.graph
+        offsets, targets, distances = (
+            (graph.reverse_offsets, graph.reverse_targets, graph.reverse_distances) if is_reverse else
+            (graph.offsets, graph.targets, graph.distances)
+        )
+        cluster = self.clusters[start_index]
+        best = {start_index: 0.0}
+        previous = {}
+        heap = [(0.0, start_index)]
+        while heap:
+            distance, index = heapq.heappop(heap)
+            if distance > best[index] or (index != start_index and index in self.portals):
+                continue
+            for k in range(offsets[index], offsets[index + 1]):
+                target = targets[k]
+                if self.clusters[target] != cluster or (blocked and target in blocked and target != allowed):
+                    continue
+                target_distance = distance + distances[k]
+                if max_distance is not None and target_distance > max_distance:
+                    continue
+                if target_distance < best.get(target, inf):
+                    best[target] = target_distance
+                    previous[target] = index
+                    heapq.heappush(heap, (target_distance, target))
+        return best, previous
+
+    def find_route(self, start_id, target_id, is_locked=None, lock_key=None, max_distance=None):
+        """Same as PlaceGraph.find_route for a single target."""
+        cache_key = (start_id, target_id, lock_key, max_distance)
+        if (is_locked is None or lock_key is not None) and cache_key in self.routes:
+            return self.routes[cache_key]
+
+        graph = self.graph
+        route = get_route(start_id, [target_id])
+        if start_id in graph.indexes and target_id in graph.indexes:
+            blocked = None
+            if is_locked is not None:
+                blocked = {graph.indexes[place_id] for place_id in graph.locked_ids if is_locked(place_id)}
+            found = self.search(graph.indexes[start_id], graph.indexes[target_id], blocked, max_distance)
+            if found:
+                graph.set_route_path(route, found)
+            elif blocked and self.search(graph.indexes[start_id], graph.indexes[target_id], None, max_distance):
+                route['status'] = 'locked'
+
+        if is_locked is None or lock_key is not None:
+            if len(self.routes) >= ROUTES_CACHE_MAX:
+                self.routes = {}
+            self.routes[cache_key] = route
+        return route
+
+    def search(self, start_index, target_index, blocked=None, max_distance=None):
+        graph = self.graph
+        if start_index == target_index:
+            return [start_index]
+        if blocked and target_index in blocked:
+            return None
+        forward, forward_previous = self.search_cluster(start_index, blocked, max_distance=max_distance)
+        backward, backward_next = self.search_cluster(
+            target_index, blocked, is_reverse=True, max_distance=max_distance, allowed=start_index
+        )
+
+        best_distance = forward.get(target_index, inf)
+        best_portal = None
+        heap = []
+        overlay = {}
+        overlay_previous = {}
+        for i, distance in forward.items():
+            if i in self.portals:
+                overlay[graph.ids[i]] = distance
+                heapq.heappush(heap, (distance, graph.ids[i]))
+        backward = {graph.ids[i]: distance for i, distance in backward.items() if i in self.portals}
+        blocked_ids = {graph.ids[i] for i in blocked} if blocked else ()
+
+        while heap:
+            distance, portal_id = heapq.heappop(heap)
+            if distance >= best_distance:
+                break
+            if distance > overlay[portal_id]:
+                continue
+            if portal_id in backward and distance + backward[portal_id] < best_distance:
+                best_distance = distance + backward[portal_id]
+                best_portal = portal_id
+            edges = [(to_id, d, [to_id]) for to_id, d in self.portal_edges.get(portal_id, ())]
+            for to_id, edge_distance, path in self.shortcuts.get(portal_id, []) + edges:
+                if to_id in blocked_ids:
+                    continue
+                to_distance = distance + edge_distance
+                if max_distance is not None and to_distance > max_distance:
+                    continue
+                if to_distance < overlay.get(to_id, inf):
+                    overlay[to_id] = to_distance
+                    overlay_previous[to_id] = (portal_id, path)
+                    heapq.heappush(heap, (to_distance, to_id))
+
+        if best_distance == inf or (max_distance is not None and best_distance > max_distance):
+            return None
+        if best_portal is None:
+            return get_path(forward_previous, target_index)
+
+        path_ids = []
+        portal_id = best_portal
+        while portal_id in overlay_previous:
+            portal_id, path = overlay_previous[portal_id]
+            path_ids[:0] = path
+        path = get_path(forward_previous, graph.indexes[portal_id]) + [graph.indexes[i] for i in path_ids]
+        return path + get_path(backward_next, graph.indexes[best_portal])[::-1][1:]
+
+
+def get_path(previous, index):
+    path = [index]
+    while path[-1] in previous:
+        path.append(previous[path[-1]])
+    return path[::-1]
+
+
+def get_graph():
+    global _graph
+    if _graph is None:
+        _graph = PlaceGraph.load()
+    return _graph
+
+
+def get_index():
+    global _index
+    graph = get_graph()
+    if _index is None:
+        _index = HierarchicalIndex(graph)
+    elif _index.graph is not graph:
+        _index.update(graph)
+    return _index
+
+
+def clear_graph(**_):
+    global _graph
+    _graph = None
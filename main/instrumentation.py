@@ -0,0 +1,107 @@
+"""
+Queries count, SQL time, slowest and repeated statements and cache hits of a block of code, used by the
+QueryInstrumentationMiddleware for requests and by the --instrument option of phased commands.
+"""
+import logging
+import re
+import time
+
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class Instrumentation:
+    """Statements are grouped by their SQL with placeholders, so repeated ones are N+1 queries candidates."""
+    def __init__(self, label):
+        self.label = label
+        self.queries = []
+        self.seconds = 0
+        self.cache_hits = None
+        self.cache_misses = None
+
+    def __call__(self, execute, sql, params, many, context):
+        time_start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - time_start))
+
+    @property
+    def queries_count(self):
+        return len(self.queries)
+
+    @property
+    def queries_seconds(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    @property
+    def slowest(self):
+        """(sql, seconds) of the slowest query, None without queries."""
+        return max(self.queries, key=lambda query: query[1], default=None)
+
+    @property
+    def duplicates(self):
+        """(sql, count) of statements run more than once, most repeated first."""
+        return [(sql, count) for sql, count in Counter(sql for sql, _ in self.queries).most_common() if count > 1]
+
+    def get_summary(self):
+        summary = f'{self.label}: {self.queries_count} queries in {self.queries_seconds:.3f}s of {self.seconds:.3f}s'
+        if self.cache_hits is not None:
+            summary += f', cache {self.cache_hits} hits, {self.cache_misses} misses'
+        return summary
+
+    def get_report(self, limit=5):
+        lines = [self.get_summary()]
+        if self.slowest:
+            lines.append('Slowest {:.3f}s: {}'.format(self.slowest[1], self.slowest[0]))
+        for sql, count in self.duplicates[:limit]:
+            lines.append(f'Repeated {count} times: {sql}')
+        return '\n'.join(lines)
+
+    def get_server_timing(self):
+        return f'sql;desc="{self.queries_count} queries";dur={self.queries_seconds * 1000:.1f}'
+
+    def get_budget(self):
+        """Max queries of the first QUERY_BUDGETS pattern found in the label, None if none is."""
+        for pattern, budget in settings.QUERY_BUDGETS.items():
+            if re.search(pattern, self.label):
+                return budget
+        return None
+
+    def check_budget(self):
+        budget = self.get_budget()
+        if budget is None or self.queries_count <= budget:
+            return
+        message = f'{self.label}: {self.queries_count} queries over the budget of {budget}'
+        if settings.QUERY_BUDGETS_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+@contextmanager
+def instrument(label):
+    """Yields an Instrumentation of the queries of every database and the default cache inside the block."""
+    instrumentation = Instrumentation(label)
+    cache = caches['default']
+    cache_hits, cache_misses = getattr(cache, 'hits', None), getattr(cache, 'misses', None)
+    time_start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(instrumentation))
+            yield instrumentation
+    finally:
+        instrumentation.seconds = time.perf_counter() - time_start
+        if cache_hits is not None:
+            instrumentation.cache_hits = cache.hits - cache_hits
+            instrumentation.cache_misses = cache.misses - cache_misses
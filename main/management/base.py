@@ -0,0 +1,176 @@
+import cProfile
+import io
+import pstats
+import re
+import time
+import tracemalloc
+
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.instrumentation import QueryBudgetExceeded, instrument, logger
+
+
+def add_build_arguments(parser, chunk_size_help):
+    parser.add_argument('--dry-run', action='store_true', help='Report planned changes without writing.')
+    parser.add_argument('--limit', type=int, help='Maximum number of characters to process.')
+    parser.add_argument('--chunk-size', type=int, default=500, help=chunk_size_help)
+
+
+def reset_memory_peak():
+    # Python 3.9+, otherwise peaks include the earlier phases
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+
+def get_db_path(stdout):
+    if settings.EXPORT_DIR.is_dir():
+        db_path = settings.EXPORT_DIR / 'db'
+    else:
+        stdout.write('Export directory not found')
+        db_path = settings.BASE_DIR / 'db'
+    db_path.mkdir(exist_ok=True)
+    return db_path
+
+
+class PhasedCommand(BaseCommand):
+    """
+    Commands timing their phases. --instrument (or QUERY_INSTRUMENTATION) also counts their queries, --profile and
+    --trace-memory report every phase and the rest of the command.
+    """
+    instrumentation = None
+    profile_options = None
+    memory_filters = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, pstats.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    )
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            '--instrument',
+            action='store_true',
+            help='Report queries and cache hits per phase and check QUERY_BUDGETS for the command name.'
+        )
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Profile every phase with cProfile, print the top functions and dump the stats to --profile-dir.'
+        )
+        parser.add_argument('--profile-dir', default='.', help='Directory of the <command>.<phase>.prof dumps.')
+        parser.add_argument(
+            '--profile-sort',
+            default=pstats.SortKey.CUMULATIVE.value,
+            choices=[key.value for key in pstats.SortKey],
+            help='Order of the printed functions.'
+        )
+        parser.add_argument(
+            '--trace-memory',
+            action='store_true',
+            help='Print the peak and the top allocations of every phase with tracemalloc.'
+        )
+        parser.add_argument('--top', type=int, default=20, help='Functions or allocations printed per phase.')
+        return parser
+
+    def execute(self, *args, **options):
+        self.phases = []
+        self.profilers = []
+        self.memory_peaks = []
+        if options.get('profile') or options.get('trace_memory'):
+            self.profile_options = options
+        is_instrumented = options.get('instrument') or settings.QUERY_INSTRUMENTATION
+        is_tracing = options.get('trace_memory') and not tracemalloc.is_tracing()
+        self.command_name = self.__module__.rsplit('.', 1)[-1]
+        if is_tracing:
+            tracemalloc.start()
+        try:
+            with instrument(self.command_name) if is_instrumented else nullcontext() as self.instrumentation:
+                with self.profile('command'):
+                    return super().execute(*args, **options)
+        finally:
+            if is_tracing:
+                tracemalloc.stop()
+            if self.phases:
+                self.stdout.write('Timings: {}'.format(', '.join([
+                    '{} {:.3f}s{}'.format(name, seconds, '' if queries is None else f' ({queries} queries)')
+                    for name, seconds, queries in self.phases
+                ])))
+            if self.instrumentation is not None:
+                logger.info(self.instrumentation.get_report())
+                try:
+                    self.instrumentation.check_budget()
+                except QueryBudgetExceeded as e:
+                    raise CommandError(e)
+
+    @contextmanager
+    def phase(self, name):
+        with self.profile(name):
+            time_start = time.perf_counter()
+            queries_start = self.instrumentation.queries_count if self.instrumentation is not None else None
+            try:
+                yield
+            finally:
+                queries = None if queries_start is None else self.instrumentation.queries_count - queries_start
+                self.phases.append((name, time.perf_counter() - time_start, queries))
+
+    @contextmanager
+    def profile(self, name):
+        """cProfile and tracemalloc reports of the block, the enclosing profiled block is paused meanwhile."""
+        options = self.profile_options
+        if options is None:
+            yield
+            return
+        profiler = snapshot = None
+        if options['profile']:
+            if self.profilers:
+                self.profilers[-1].disable()
+            profiler = cProfile.Profile()
+            self.profilers.append(profiler)
+        if options['trace_memory']:
+            if self.memory_peaks:
+                self.memory_peaks[-1] = max(self.memory_peaks[-1], tracemalloc.get_traced_memory()[1])
+            self.memory_peaks.append(0)
+            snapshot = tracemalloc.take_snapshot()
+            reset_memory_peak()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                self.profilers.pop()
+            if snapshot:
+                peak = max(tracemalloc.get_traced_memory()[1], self.memory_peaks.pop())
+                if self.memory_peaks:
+                    self.memory_peaks[-1] = max(self.memory_peaks[-1], peak)
+                self.write_memory(name, snapshot, peak)
+            if profiler:
+                self.write_profile(name, profiler)
+                if self.profilers:
+                    self.profilers[-1].enable()
+
+    def write_profile(self, name, profiler):
+        profile_dir = Path(self.profile_options['profile_dir'])
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        path = profile_dir / '{}.{}.prof'.format(self.command_name, re.sub(r'\W+', '_', name))
+        profiler.dump_stats(path)
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(self.profile_options['profile_sort']).print_stats(self.profile_options['top'])
+        self.stdout.write(f'Profile of {name}, saved to "{path}"')
+        self.stdout.write(stream.getvalue().strip('\n'))
+
+    def write_memory(self, name, snapshot, peak):
+        stats = tracemalloc.take_snapshot().filter_traces(self.memory_filters).compare_to(
+            snapshot.filter_traces(self.memory_filters), 'lineno'
+        )
+        self.stdout.write(f'Memory of {name}: peak {peak / 2 ** 20:.1f}MB')
+        for stat in [stat for stat in stats if stat.size_diff > 0][:self.profile_options['top']]:
+            self.stdout.write(f'  {stat}')
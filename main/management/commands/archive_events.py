@@ -0,0 +1,32 @@
+import gzip
+import json
+
+from main.events import ARCHIVE_FIELDS, archive_events
+from main.management.base import PhasedCommand
+from main.signals import suppress_cache_clear
+
+
+class Command(PhasedCommand):
+    help = 'Move old events from EventLog to compressed EventLogArchive chunks or a gzip JSON lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=int, required=True, help='In-game timestamp (seconds) to archive before.')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Events per archive chunk.')
+        parser.add_argument('--file', help='Append events to this gzip JSON lines file instead of EventLogArchive.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Start')
+        with self.phase('archive'), suppress_cache_clear():
+            if options['file']:
+                with gzip.open(options['file'], 'at') as f:
+                    count = archive_events(
+                        options['before'],
+                        options['chunk_size'],
+                        on_chunk=lambda rows: f.writelines(
+                            [f'{json.dumps(dict(zip(ARCHIVE_FIELDS, row)))}\n' for row in rows]
+                        )
+                    )
+            else:
+                count = archive_events(options['before'], options['chunk_size'])
+        self.stdout.write(f'Archived events: {count}')
+        self.stdout.write('Done')
@@ -0,0 +1,82 @@
+import datetime
+import json
+import platform
+
+import django
+
+from django.core.management.base import CommandError
+from django.db import connection
+
+from main.benchmarks.measure import compare_results
+from main.benchmarks.suite import run_benchmarks
+from main.management.base import PhasedCommand
+
+
+class Command(PhasedCommand):
+    help = 'Measure the build commands, the export, the cache warmup and the admin pages on synthetic worlds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[100, 300], help='Characters of the benchmarked worlds.'
+        )
+        parser.add_argument('--only', nargs='+', help='Benchmarks to measure, others run only to build the data.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the generated worlds.')
+        parser.add_argument(
+            '--no-memory',
+            action='store_true',
+            help='Do not trace memory, tracing slows down the measured code.'
+        )
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='Fail if the results regressed against this JSON file.')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=.2,
+            help='Allowed growth of a metric against the compared results, 0.2 is 20%%.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Start')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            if baseline.get('trace_memory') != (not options['no_memory']):
+                self.stdout.write('Memory tracing differs from the compared results, timings are not comparable')
+
+        with self.phase('benchmarks'):
+            results = run_benchmarks(
+                options['sizes'],
+                names=options['only'],
+                seed=options['seed'],
+                trace_memory=not options['no_memory'],
+                log=self.write_result
+            )
+        data = {
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'seed': options['seed'],
+            'trace_memory': not options['no_memory'],
+            'results': results
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(json.dumps(data, indent=4))
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if baseline is not None:
+            regressions = compare_results(results, baseline['results'], options['threshold'])
+            for result, metric, value in regressions:
+                self.stdout.write(f'{result["name"]} ({result["size"]}) {metric}: {value} -> {result[metric]}')
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions over {options["threshold"]:.0%}')
+        self.stdout.write('Done')
+
+    def write_result(self, result):
+        peak_memory = '-' if result['peak_memory'] is None else f'{result["peak_memory"] / 2 ** 20:.1f}MB'
+        self.stdout.write(
+            f'{result["size"]:>8} {result["name"]:<40} {result["seconds"]:>9.3f}s {peak_memory:>10} '
+            f'{result["queries"]:>7} queries'
+        )
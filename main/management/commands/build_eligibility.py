@@ -0,0 +1,46 @@
+import json
+
+from main.eligibility import get_eligibility, load_chars, load_plans, pack_bits
+from main.management.base import PhasedCommand, get_db_path
+
+
+class Command(PhasedCommand):
+    help = 'Export static character x plan eligibility as packed bitsets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report eligible counts without writing.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Start')
+        with self.phase('load'):
+            chars = load_chars()
+            plans = load_plans()
+
+        with self.phase('evaluate'):
+            eligibility = get_eligibility(chars, plans)
+
+        if options['verbosity'] >= 2 or options['dry_run']:
+            for plan in plans:
+                data = eligibility[plan.id]
+                second = data['second']
+                self.stdout.write('{}: first {}, second {}'.format(
+                    plan.title, data['first'].sum(), 'any' if second is None else second.sum()
+                ))
+        if options['dry_run']:
+            self.stdout.write(f'Characters: {len(chars)}, plans: {len(plans)}')
+            return
+
+        with self.phase('write'):
+            db_path = get_db_path(self.stdout)
+            with open(db_path / 'eligibility.json', 'w') as f:
+                f.write(json.dumps({
+                    'characters_ids': [char['id'] for char in chars],
+                    'plans': {
+                        plan_id: {
+                            'first': pack_bits(data['first']),
+                            'second': None if data['second'] is None else pack_bits(data['second'])
+                        } for plan_id, data in eligibility.items()
+                    }
+                }, indent=4))
+        self.stdout.write(f'Characters: {len(chars)}, plans: {len(plans)}')
+        self.stdout.write(f'Saved to: "{db_path / "eligibility.json"}"')
@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.db.models import Count, Sum
+
+from main.management.base import PhasedCommand
+from main.models import Character, CharacterRelationship, FactionRelationship
+
+
+def get_relationships_changes(queryset, from_field, to_field, values):
+    """Split {(from_id, to_id): value} into new model instances to create and existing ones to update."""
+    existing = {(r[0], r[1]): (r[2], r[3]) for r in queryset.values_list(from_field, to_field, 'id', 'value')}
+    relations_create = []
+    relations_update = []
+    for (from_id, to_id), value in values.items():
+        relation = queryset.model(**{from_field: from_id, to_field: to_id, 'value': value})
+        if (from_id, to_id) not in existing:
+            relations_create.append(relation)
+        elif existing[(from_id, to_id)][1] != value:
+            relation.id = existing[(from_id, to_id)][0]
+            relations_update.append(relation)
+    return relations_create, relations_update
+
+
+class Command(PhasedCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report planned changes without writing.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Start')
+        default = settings.RELATIONSHIPS_DEFAULT_VALUE
+        if default is None:
+            default = CharacterRelationship._meta.get_field('value').default  # noqa
+
+        with self.phase('aggregate'):
+            members = dict(Character.objects.filter(
+                is_original=True
+            ).values(
+                'faction_id'
+            ).annotate(
+                count=Count('id')
+            ).values_list(
+                'faction_id', 'count'
+            ))
+            totals = CharacterRelationship.objects.filter(
+                from_character__is_original=True, to_character__is_original=True
+            ).values(
+                'from_character__faction_id', 'to_character__faction_id'
+            ).annotate(
+                total=Sum('value'), count=Count('id')
+            ).values_list(
+                'from_character__faction_id', 'to_character__faction_id', 'total', 'count'
+            )
+            totals = {(from_id, to_id): (total, count) for from_id, to_id, total, count in totals}
+
+        with self.phase('compute'):
+            values = {}
+            for from_id in members:
+                for to_id in members:
+                    if from_id == to_id:
+                        continue
+                    # pairs without stored relationship have the default value (sparse mode or not built yet)
+                    pairs = members[from_id] * members[to_id]
+                    total, count = totals.get((from_id, to_id), (0, 0))
+                    value = int((total + (pairs - count) * default) / pairs)
+                    values[(from_id, to_id)] = min(max(value, 100), 1000)
+            relations_create, relations_update = get_relationships_changes(
+                FactionRelationship.objects.all(), 'from_faction_id', 'to_faction_id', values
+            )
+
+        if options['verbosity'] > 1:
+            for relation in relations_create + relations_update:
+                self.stdout.write(f'{relation.from_faction_id} -> {relation.to_faction_id} = {relation.value}')
+
+        if options['dry_run']:
+            self.stdout.write(f'Planned {len(relations_create)} creates, {len(relations_update)} updates')
+            self.stdout.write('Done')
+            return
+
+        with self.phase('save'):
+            if relations_create:
+                FactionRelationship.objects.bulk_create(relations_create, ignore_conflicts=True)
+                self.stdout.write(f'Created {len(relations_create)} objects')
+            if relations_update:
+                FactionRelationship.objects.bulk_update(relations_update, fields=['value'])
+                self.stdout.write(f'Updated {len(relations_update)} objects')
+            if not relations_create and not relations_update:
+                self.stdout.write('No changes')
+        self.stdout.write('Done')
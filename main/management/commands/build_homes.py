@@ -1,63 +1,166 @@
 import random
 
-from django.core.management.base import BaseCommand
+from collections import defaultdict
 
+from django.db import transaction
+
+from main.management.base import PhasedCommand, add_build_arguments
 from main.models import Character, Place, PlaceTransition
+from main.signals import clear_cache_post_save
+
+HOME_ROOMS = (
+    ('hallway', 'Hallway'),
+    ('living_room', 'Living room'),
+    ('bedroom', 'Bedroom'),
+    ('dining', 'Dining'),
+)
+
+
+def get_home_plan(char, bound_place, rand):
+    if char.settlement_id:
+        distance = round(rand.uniform(0.3, 0.7), 2)
+        title_base = f'{char.title}_{char.settlement.title}'
+    else:
+        distance = round(rand.uniform(0.5, 0.9), 2)
+        title_base = f'{char.title}_{bound_place.title}'
+    return {
+        'char': char,
+        'bound_place': bound_place,
+        'title_base': title_base,
+        'distance': distance,
+        'rooms_distances': [round(rand.uniform(0.001, 0.01), 3) for _ in range(4)]
+    }
+
+
+def get_base_data(char):
+    return {'owner_id': char.id, 'settlement_id': char.settlement_id, 'beauty': 600, 'fertility': 100, 'safety': 1000}
+
+
+def get_place_ids(titles):
+    return dict(Place.objects.filter(title__in=titles).values_list('title', 'id'))
+
+
+def get_home_rooms(home):
+    """Places data of the home rooms in HOME_ROOMS order."""
+    base_data = get_base_data(home['char'])
+    return [
+        {'title': f'{home["title_base"]}_{place_type}', 'name': name, 'place_type': place_type, **base_data}
+        for place_type, name in HOME_ROOMS
+    ]
+
+
+def get_home_entrance(home, hallway_id):
+    char = home['char']
+    return {
+        'title': f'{home["title_base"]}_entrance',
+        'name': 'Entrance',
+        'place_type': 'entrance',
+        'is_locked': True,
+        'lock_filters': {'id__or': char.id, 'place_id__or': hallway_id},
+        **get_base_data(char)
+    }
+
 
+def get_home_transitions(home, places_ids):
+    """
+    (from place id, to place id, distance) of the entrance to the bound place and every room to the hallway,
+    both ways. places_ids: {place type: id}.
+    """
+    hallway_id = places_ids['hallway']
+    entrance_id = places_ids['entrance']
+    bound_place_id = home['bound_place'].id
+    transitions = [
+        (bound_place_id, entrance_id, home['distance']),
+        (entrance_id, bound_place_id, home['distance'])
+    ]
+    for place_type, distance in zip(('entrance', 'living_room', 'bedroom', 'dining'), home['rooms_distances']):
+        place_id = places_ids[place_type]
+        transitions.append((place_id, hallway_id, distance))
+        transitions.append((hallway_id, place_id, distance))
+    return transitions
+
+
+def create_homes(homes):
+    places = [Place(**data) for home in homes for data in get_home_rooms(home)]
+    Place.objects.bulk_create(places)
+    places_ids = get_place_ids([place.title for place in places])
+
+    entrances = [Place(**get_home_entrance(home, places_ids[f'{home["title_base"]}_hallway'])) for home in homes]
+    Place.objects.bulk_create(entrances)
+    places_ids.update(get_place_ids([place.title for place in entrances]))
+
+    transitions = []
+    for home in homes:
+        home_places_ids = {
+            place_type: places_ids[f'{home["title_base"]}_{place_type}']
+            for place_type in ('entrance', *[place_type for place_type, _ in HOME_ROOMS])
+        }
+        transitions.extend(
+            PlaceTransition(from_place_id=from_place_id, to_place_id=to_place_id, distance=distance)
+            for from_place_id, to_place_id, distance in get_home_transitions(home, home_places_ids)
+        )
+    PlaceTransition.objects.bulk_create(transitions)
+
+
+class Command(PhasedCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, help='Seed for bound places and distances.')
+        add_build_arguments(parser, 'Number of homes created per transaction.')
 
-class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('Start')
+        rand = random.Random(options['seed'])
 
-        for char in Character.objects.filter(is_clone=False):
-            if Place.objects.filter(owner=char, place_type='bedroom').exists():
-                continue
-
-            if char.settlement_id:
-                bound_place = Place.objects.filter(
-                    settlement=char.settlement, place_type='street'
-                ).order_by('?').first()
-                distance = round(random.uniform(0.3, 0.7), 2)
-                title_base = f'{char.title}_{char.settlement.title}'
-            else:
-                bound_place = Place.objects.filter(
-                    safety__gte=500,
-                    beauty__gte=300,
-                    settlement__isnull=True,
-                    place_type='region'
-                ).order_by('?').first()
-                distance = round(random.uniform(0.5, 0.9), 2)
-                title_base = f'{char.title}_{bound_place.title}'
-
-            base_data = {'owner': char, 'settlement': char.settlement, 'beauty': 600, 'fertility': 100, 'safety': 1000}
-            hallway = Place.objects.create(
-                title=f'{title_base}_hallway', name='Hallway', place_type='hallway', **base_data
-            )
-            room = Place.objects.create(
-                title=f'{title_base}_living_room', name='Living room', place_type='living_room', **base_data
-            )
-            bedroom = Place.objects.create(
-                title=f'{title_base}_bedroom', name='Bedroom', place_type='bedroom', **base_data
-            )
-            dining = Place.objects.create(
-                title=f'{title_base}_dining', name='Dining', place_type='dining', **base_data
-            )
-            entrance = Place.objects.create(
-                title=f'{title_base}_entrance',
-                name='Entrance',
-                place_type='entrance',
-                is_locked=True,
-                lock_filters={'id__or': char.id, 'place_id__or': hallway.id},
-                **base_data
-            )
+        with self.phase('load'):
+            owners_ids = set(Place.objects.filter(
+                place_type='bedroom', owner__isnull=False
+            ).values_list(
+                'owner_id', flat=True
+            ))
+            chars = [
+                char for char in Character.objects.filter(is_clone=False).select_related('settlement').order_by('id')
+                if char.id not in owners_ids
+            ]
+            if options['limit'] is not None:
+                chars = chars[:options['limit']]
+            streets = defaultdict(list)
+            for place in Place.objects.filter(place_type='street', settlement__isnull=False).order_by('id'):
+                streets[place.settlement_id].append(place)
+            regions = list(Place.objects.filter(
+                safety__gte=500,
+                beauty__gte=300,
+                settlement__isnull=True,
+                place_type='region'
+            ).order_by(
+                'id'
+            ))
+
+        with self.phase('plan'):
+            homes = []
+            for char in chars:
+                bound_places = streets[char.settlement_id] if char.settlement_id else regions
+                if not bound_places:
+                    self.stdout.write(f'No place to bind home for {char.title}')
+                    continue
+                homes.append(get_home_plan(char, rand.choice(bound_places), rand))
 
-            PlaceTransition.objects.create(from_place=bound_place, to_place=entrance, distance=distance)
-            PlaceTransition.objects.create(from_place=entrance, to_place=bound_place, distance=distance)
-            for place in (entrance, room, bedroom, dining):
-                distance = round(random.uniform(0.001, 0.01), 3)
-                PlaceTransition.objects.create(from_place=place, to_place=hallway, distance=distance)
-                PlaceTransition.objects.create(from_place=hallway, to_place=place, distance=distance)
+        if options['dry_run']:
+            for home in homes:
+                self.stdout.write(f'Home for {home["char"].title} near {home["bound_place"].title}')
+            self.stdout.write(
+                f'Planned {len(homes)} homes: {len(homes) * 5} places, {len(homes) * 10} transitions'
+            )
+            self.stdout.write('Done')
+            return
 
-            self.stdout.write(f'Created home for {char.title}')
+        with self.phase('create'):
+            chunk_size = options['chunk_size']
+            for i in range(0, len(homes), chunk_size):
+                with transaction.atomic():
+                    create_homes(homes[i:i + chunk_size])
+            for home in homes:
+                self.stdout.write(f'Created home for {home["char"].title}')
+            if homes:
+                clear_cache_post_save()
 
         self.stdout.write('Done')
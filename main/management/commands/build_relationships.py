@@ -1,66 +1,138 @@
-from django.core.management.base import BaseCommand
+import numpy as np
 
-from main.models import Character, CharacterRelationship
+from django.conf import settings
+from django.db.models import Q
 
+from main.management.base import PhasedCommand, add_build_arguments
+from main.models import Character, CharacterRelationship
+from main.relationships import (
+    INCREMENTAL_CHANGED_MAX,
+    RelationshipsDiff,
+    get_fingerprints,
+    iter_chunks,
+    load_attrs,
+    load_relationships
+)
 
-def get_opinion(first, second, is_negative=True, is_difference=True, first_mod=.5, second_mod=1.5):
-    opinion = 0
-    if first > 500 and second > 500:
-        opinion = (first * first_mod + second * second_mod) - 1000
-    elif is_negative and first < 500 and second < 500:
-        opinion = 1000 - (first * first_mod + second * second_mod)
-    elif is_difference and (first > 500 > second or first < 500 < second):
-        opinion = -abs(first - second)
-    else:
-        return opinion
-    return opinion / 2  # values should be in range 0-500
 
+class Command(PhasedCommand):
+    def add_arguments(self, parser):
+        add_build_arguments(parser, 'Number of relationships per bulk query.')
+        parser.add_argument('--block-size', type=int, default=512, help='Rows of the opinion matrix per block.')
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute all pairs, required after changing the opinion formula or RELATIONSHIPS_DEFAULT_VALUE.'
+        )
 
-class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('Start')
 
-        chars = list(Character.objects.filter(is_original=True))
-        chars_relations_pks = {
-            (r['from_character_id'], r['to_character_id']): r for r in CharacterRelationship.objects.values()
-        }
-        relations_create = []
-        relations_update = []
+        with self.phase('load'):
+            chars = Character.objects.filter(is_original=True)
+            if options['limit'] is not None:
+                chars = chars.filter(id__in=chars.order_by('id').values('id')[:options['limit']])
+            chars_ids, chars_attrs = load_attrs(chars)
+            fingerprints = get_fingerprints(chars_attrs)
+            fingerprints_saved = dict(chars.values_list('id', 'relationships_fingerprint'))
+            changed = np.array([
+                i for i, (char_id, fingerprint) in enumerate(zip(chars_ids.tolist(), fingerprints))
+                if fingerprints_saved[char_id] != fingerprint
+            ], dtype=np.int64)
+            is_full = options['full'] or len(changed) > min(INCREMENTAL_CHANGED_MAX, len(chars_ids) // 2)
+            chars_changed_ids = chars_ids[changed].tolist()
 
-        for char_from in chars:
-            for char_to in chars:
-                if char_from.pk == char_to.pk:
-                    continue
+            # plain scan, relationships of other characters are dropped by RelationshipsDiff, the two "__in" subqueries
+            # are looked up as a cross product of characters in the unique index
+            relationships = CharacterRelationship.objects.all()
+            if not is_full:
+                relationships = relationships.filter(
+                    Q(from_character_id__in=chars_changed_ids) | Q(to_character_id__in=chars_changed_ids)
+                )
+            relationships = load_relationships(relationships, 'from_character_id', 'to_character_id')
 
-                opinion = 500
-                opinion += get_opinion(char_from.intelligence, char_to.intelligence) * .2
-                opinion += get_opinion(char_from.pride, char_to.pride) * .2
+            chars_removed = []
+            if options['limit'] is None:
+                chars_removed = list(Character.objects.exclude(
+                    relationships_fingerprint=''
+                ).exclude(
+                    id__in=chars
+                ).values_list(
+                    'id', flat=True
+                ))
 
-                if opinion > 1000:
-                    opinion = 1000
-                elif opinion < 100:
-                    opinion = 100
-                opinion = int(opinion)
+        with self.phase('compute'):
+            diff = RelationshipsDiff(
+                chars_ids,
+                chars_attrs,
+                relationships,
+                changed=None if is_full else changed,
+                default=settings.RELATIONSHIPS_DEFAULT_VALUE,
+                block_size=options['block_size']
+            )
 
-                self.stdout.write(f'{char_from.title} -> {char_to.title} = {opinion}')
+        self.stdout.write(f'Characters: {len(chars_ids)}, changed: {len(changed)}, removed: {len(chars_removed)}')
+        if options['dry_run']:
+            self.stdout.write(
+                f'Planned {diff.creates_count} creates, {len(diff.update_pks)} updates, {len(diff.delete_pks)} deletes'
+            )
+            self.stdout.write('Done')
+            return
 
-                c_relationship = CharacterRelationship(
-                    from_character_id=char_from.pk, to_character_id=char_to.pk, value=opinion
+        with self.phase('save'):
+            chunk_size = options['chunk_size']
+            created = 0
+            for from_ids, to_ids, values in diff.iter_creates():
+                relations_create = [
+                    CharacterRelationship(from_character_id=from_id, to_character_id=to_id, value=value)
+                    for from_id, to_id, value in zip(from_ids.tolist(), to_ids.tolist(), values.tolist())
+                ]
+                CharacterRelationship.objects.bulk_create(
+                    relations_create, batch_size=chunk_size, ignore_conflicts=True
                 )
-                chars_relations_pks_key = (char_from.pk, char_to.pk)
-                if chars_relations_pks_key in chars_relations_pks:
-                    if chars_relations_pks[chars_relations_pks_key]['value'] != opinion:
-                        c_relationship.id = chars_relations_pks[(char_from.pk, char_to.pk)]['id']
-                        relations_update.append(c_relationship)
-                else:
-                    relations_create.append(c_relationship)
-
-        if relations_create:
-            CharacterRelationship.objects.bulk_create(relations_create, ignore_conflicts=True)
-            self.stdout.write(f'Created {len(relations_create)} objects')
-        if relations_update:
-            CharacterRelationship.objects.bulk_update(relations_update, fields=['value'])
-            self.stdout.write(f'Updated {len(relations_update)} objects')
-        if not relations_create and not relations_update:
-            self.stdout.write('No changes')
+                created += len(relations_create)
+                self.write_relationships(relations_create, options['verbosity'])
+            if created:
+                self.stdout.write(f'Created {created} objects')
+
+            relations_update = (
+                CharacterRelationship(id=pk, value=value)
+                for pk, value in zip(diff.update_pks.tolist(), diff.update_values.tolist())
+            )
+            updated = 0
+            for chunk in iter_chunks(relations_update, chunk_size):
+                CharacterRelationship.objects.bulk_update(chunk, fields=['value'])
+                updated += len(chunk)
+            if updated:
+                self.stdout.write(f'Updated {updated} objects')
+
+            deleted = 0
+            for chunk in iter_chunks(diff.delete_pks.tolist(), chunk_size):
+                deleted += CharacterRelationship.objects.filter(id__in=chunk).delete()[0]
+            if chars_removed:
+                deleted += CharacterRelationship.objects.filter(
+                    Q(from_character_id__in=chars_removed) | Q(to_character_id__in=chars_removed)
+                ).delete()[0]
+                Character.objects.filter(id__in=chars_removed).update(relationships_fingerprint='')
+            if deleted:
+                self.stdout.write(f'Deleted {deleted} objects')
+
+            # pairs with characters outside the limit are not built, fingerprints would mark them as up to date
+            if options['limit'] is None:
+                chars_fingerprints = [
+                    Character(id=chars_ids[i].item(), relationships_fingerprint=fingerprints[i])
+                    for i in changed.tolist()
+                ]
+                Character.objects.bulk_update(
+                    chars_fingerprints, ['relationships_fingerprint'], batch_size=chunk_size
+                )
+
+            if not created and not updated and not deleted:
+                self.stdout.write('No changes')
         self.stdout.write('Done')
+
+    def write_relationships(self, relations, verbosity):
+        if verbosity < 2:
+            return
+        for relation in relations:
+            self.stdout.write(f'{relation.from_character_id} -> {relation.to_character_id} = {relation.value}')
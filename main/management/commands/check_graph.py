@@ -0,0 +1,121 @@
+from collections import Counter, deque
+
+import numpy as np
+
+from django.core.management.base import CommandError
+
+from main.graph import PlaceGraph
+from main.management.base import PhasedCommand
+from main.models import Place, PlaceTransition
+
+
+def get_components(size, edges):
+    """Weakly connected components with union-find, returns a root index for every place."""
+    parents = list(range(size))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for from_index, to_index in edges:
+        from_root, to_root = find(from_index), find(to_index)
+        if from_root != to_root:
+            parents[from_root] = to_root
+    return [find(i) for i in range(size)]
+
+
+def get_reachable(start_index, offsets, targets):
+    reachable = {start_index}
+    queue = deque([start_index])
+    while queue:
+        index = queue.popleft()
+        for i in range(offsets[index], offsets[index + 1]):
+            if targets[i] not in reachable:
+                reachable.add(targets[i])
+                queue.append(targets[i])
+    return reachable
+
+
+class Command(PhasedCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--max-items', type=int, default=20, help='Maximum listed places per issue.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Start')
+        self.max_items = options['max_items']
+        self.issues_count = 0
+
+        with self.phase('load'):
+            places = {
+                place_id: (title, place_type, settlement_id, owner_id)
+                for place_id, title, place_type, settlement_id, owner_id in Place.objects.values_list(
+                    'id', 'title', 'place_type', 'settlement_id', 'owner_id'
+                )
+            }
+            transitions = list(PlaceTransition.objects.values_list('from_place_id', 'to_place_id', 'distance'))
+            graph = PlaceGraph(sorted(places), transitions)
+
+        with self.phase('edges'):
+            distances = {(from_id, to_id): distance for from_id, to_id, distance in transitions}
+            self.report('Zero or negative distance', [
+                f'{places[from_id][0]} > {places[to_id][0]} ({distance})'
+                for (from_id, to_id), distance in distances.items() if distance <= 0
+            ])
+            self.report('Missing reverse transition', [
+                f'{places[from_id][0]} > {places[to_id][0]}'
+                for from_id, to_id in distances if (to_id, from_id) not in distances
+            ])
+            self.report('Different reverse distance', [
+                f'{places[from_id][0]} <> {places[to_id][0]} ({distance}, {distances[(to_id, from_id)]})'
+                for (from_id, to_id), distance in distances.items()
+                if from_id < to_id and (to_id, from_id) in distances and distances[(to_id, from_id)] != distance
+            ])
+            connected = {place_id for pair in distances for place_id in pair}
+            self.report('Dangling place', [places[place_id][0] for place_id in places if place_id not in connected])
+
+        with self.phase('components'):
+            from_indexes = np.repeat(np.arange(len(graph.ids)), np.diff(graph.offsets))
+            roots = get_components(len(graph.ids), zip(from_indexes.tolist(), graph.targets.tolist()))
+            roots_sizes = Counter(roots)
+            if roots_sizes:
+                main_root = roots_sizes.most_common(1)[0][0]
+                self.report('Disconnected place', [
+                    places[graph.ids[i]][0] for i, root in enumerate(roots)
+                    if root != main_root and graph.ids[i] in connected
+                ])
+                main_index = roots.index(main_root)
+                reachable = get_reachable(main_index, graph.offsets, graph.targets)
+                reaching = get_reachable(main_index, graph.reverse_offsets, graph.reverse_targets)
+                self.report('One-way reachable place', [
+                    places[graph.ids[i]][0] for i, root in enumerate(roots)
+                    if root == main_root and (i not in reachable or i not in reaching)
+                ])
+
+        with self.phase('homes'):
+            entrances_ids = [
+                place_id for place_id, (_, place_type, _, owner_id) in places.items()
+                if place_type == 'entrance' and owner_id
+            ]
+            self.report('Home without street', [
+                places[place_id][0] for place_id in entrances_ids if not any(
+                    places[neighbour_id][1] in ('street', 'region') and places[neighbour_id][2] == places[place_id][2]
+                    for neighbour_id in graph.get_neighbours(place_id)
+                )
+            ])
+
+        self.stdout.write(f'Places: {len(places)}, transitions: {len(transitions)}, components: {len(roots_sizes)}')
+        if self.issues_count:
+            raise CommandError(f'Found {self.issues_count} issues')
+        self.stdout.write('Done')
+
+    def report(self, name, items):
+        if not items:
+            return
+        self.issues_count += len(items)
+        self.stdout.write(f'{name}: {len(items)}')
+        for item in items[:self.max_items]:
+            self.stdout.write(f'  {item}')
+        if len(items) > self.max_items:
+            self.stdout.write(f'  ...and {len(items) - self.max_items} more')
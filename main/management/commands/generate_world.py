@@ -0,0 +1,47 @@
+from django.db import transaction
+
+from main.management.base import PhasedCommand
+from main.signals import clear_cache_post_save
+from main.world import WorldGenerator, save_world
+
+
+class Command(PhasedCommand):
+    help = 'Generate a synthetic world (characters with homes, places, plans, relationships, events) for scale tests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--characters', type=int, default=1000, help='Number of characters.')
+        parser.add_argument('--settlements', type=int, help='Number of settlements, 1 per 500 characters by default.')
+        parser.add_argument('--streets', type=int, default=5, help='Streets per settlement.')
+        parser.add_argument('--regions', type=int, help='Number of regions, as many as settlements by default.')
+        parser.add_argument('--factions', type=int, default=5, help='Number of factions.')
+        parser.add_argument('--plans', type=int, default=30, help='Number of plans.')
+        parser.add_argument('--relationships', type=int, default=5, help='Relationships per character.')
+        parser.add_argument('--events', type=int, default=2, help='Events per character.')
+        parser.add_argument('--days', type=int, default=7, help='In-game days of events.')
+        parser.add_argument('--without-homes', action='store_true', help='Leave homes to build_homes.')
+        parser.add_argument('--seed', type=int, help='Seed for the generated world.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Start')
+        generator = WorldGenerator(
+            options['characters'],
+            settlements=options['settlements'],
+            streets=options['streets'],
+            regions=options['regions'],
+            factions=options['factions'],
+            plans=options['plans'],
+            relationships=options['relationships'],
+            events=options['events'],
+            days=options['days'],
+            homes=not options['without_homes'],
+            seed=options['seed']
+        )
+        with transaction.atomic():
+            # ids are allocated from the current maximum ones, nothing should be inserted meanwhile
+            with self.phase('generate'):
+                rows = generator.generate()
+            save_world(rows, phase=self.phase)
+        for model, model_rows in rows.items():
+            self.stdout.write(f'{model.__name__}: {len(model_rows)}')
+        clear_cache_post_save()
+        self.stdout.write('Done')
@@ -0,0 +1,41 @@
+import sys
+
+from main.events import EventsResolver, import_events, iter_events
+from main.management.base import PhasedCommand
+from main.signals import clear_cache_post_save
+
+
+class Command(PhasedCommand):
+    help = 'Import game events from a JSON lines or JSON array file ("-" for stdin) into EventLog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Events file, items like {"timestamp": 3600, "plan": "relax", ...}.')
+        parser.add_argument('--lines', action='store_true', help='Force JSON lines format.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Events per bulk insert.')
+        parser.add_argument('--transaction-size', type=int, default=100000, help='Events per transaction.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Start')
+        with self.phase('load'):
+            resolver = EventsResolver()
+
+        with self.phase('import'):
+            if options['path'] == '-':
+                count = self.import_file(sys.stdin, resolver, options, is_lines=True)
+            else:
+                with open(options['path']) as f:
+                    count = self.import_file(f, resolver, options, is_lines=options['lines'] or None)
+            if count:
+                clear_cache_post_save()
+
+        self.stdout.write(f'Events: {count}, not found relations: {resolver.unresolved_count}')
+        self.stdout.write('Done')
+
+    @staticmethod
+    def import_file(f, resolver, options, is_lines):
+        return import_events(
+            iter_events(f, is_lines=is_lines),
+            resolver,
+            batch_size=options['batch_size'],
+            transaction_size=options['transaction_size']
+        )
@@ -0,0 +1,93 @@
+import os
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from django.db import transaction
+
+from main import simulation
+from main.effects import get_changes
+from main.events import update_rollups
+from main.management.base import PhasedCommand, get_db_path
+from main.models import Character, EventLog, Place, Plan
+
+
+class Command(PhasedCommand):
+    help = 'Run simulation ticks over exported data without the game, see main.simulation for simplifications.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--db-path', help='Exported data directory, db_to_json output by default.')
+        parser.add_argument('--ticks', type=int, default=1008, help='Number of ticks, default is a week of 10 minutes.')
+        parser.add_argument('--tick-minutes', type=int, default=10, help='In-game minutes per tick.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Process pool size.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--save-events', action='store_true', help='Save finished plans to EventLog.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='EventLog rows per bulk insert.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Start')
+        with self.phase('load'):
+            world = simulation.load_world(Path(options['db_path']) if options['db_path'] else get_db_path(self.stdout))
+            partitions = simulation.get_partitions(world, options['workers'])
+        if not partitions:
+            self.stdout.write('No characters')
+            return
+
+        args = [
+            (chars, options['seed'] + i * simulation.SEED_STEP, options['ticks'], options['tick_minutes'],
+             options['save_events'])
+            for i, chars in enumerate(partitions)
+        ]
+        before = np.array(
+            [[char[attr] for attr in simulation.SIMULATED_ATTRS] for chars in partitions for char in chars],
+            dtype=np.float64
+        )
+        with self.phase('simulate'):
+            if len(partitions) == 1:
+                simulation.init_worker(world)
+                results = [simulation.simulate_partition(*args[0])]
+            else:
+                with ProcessPoolExecutor(
+                    len(partitions), initializer=simulation.init_worker, initargs=(world,)
+                ) as executor:
+                    results = list(executor.map(simulation.simulate_partition, *zip(*args)))
+
+        after = np.concatenate([stats for stats, _, _ in results])
+        counts = sum([result_counts for _, result_counts, _ in results], Counter())
+        events = [event for _, _, result_events in results for event in result_events]
+        for plan_id, plan in sorted(world['Plan'].items()):
+            plan_counts = [counts[(plan_id, k)] for k in ('started', 'finished', 'broken')]
+            if any(plan_counts):
+                self.stdout.write('{}: started {}, finished {}, broken {}'.format(plan['title'], *plan_counts))
+        for i, attr in enumerate(simulation.SIMULATED_ATTRS):
+            changes = get_changes(before[:, i], after[:, i])
+            self.stdout.write('{}: mean {} > {}, min {} > {}, max {} > {}'.format(
+                attr, changes['before']['mean'], changes['after']['mean'], changes['before']['min'],
+                changes['after']['min'], changes['before']['max'], changes['after']['max']
+            ))
+        finished_count = sum([v for (_, k), v in counts.items() if k == 'finished'])
+        self.stdout.write(f'Characters: {len(before)}, ticks: {options["ticks"]}, finished plans: {finished_count}')
+
+        if options['save_events'] and events:
+            with self.phase('save'):
+                self.save_events(events, options['batch_size'])
+        self.stdout.write('Done')
+
+    @staticmethod
+    def save_events(events, batch_size):
+        chars_ids = set(Character.objects.values_list('id', flat=True))
+        plans_ids = set(Plan.objects.values_list('id', flat=True))
+        places_ids = set(Place.objects.values_list('id', flat=True))
+        with transaction.atomic():
+            update_rollups(EventLog.objects.bulk_create([
+                EventLog(
+                    timestamp=timestamp,
+                    plan_id=plan_id if plan_id in plans_ids else None,
+                    first_character_id=char_id if char_id in chars_ids else None,
+                    place_id=place_id if place_id in places_ids else None,
+                    is_important=is_important
+                ) for timestamp, plan_id, char_id, place_id, is_important in events
+            ], batch_size=batch_size))
@@ -1,14 +1,15 @@
-from django.core.management.base import BaseCommand
-
+from main.management.base import PhasedCommand
 from main.models import Place
 
 
-class Command(BaseCommand):
+class Command(PhasedCommand):
     def handle(self, *args, **options):
         self.stdout.write('Start')
-        places = []
-        for place in Place.objects.all():
-            place.population = place.character_set.count()
-            places.append(place)
-        Place.objects.bulk_update(places, ['population'])
+        with self.phase('count'):
+            places = []
+            for place in Place.objects.all():
+                place.population = place.character_set.count()
+                places.append(place)
+        with self.phase('save'):
+            Place.objects.bulk_update(places, ['population'])
         self.stdout.write('Done')
@@ -0,0 +1,160 @@
+import os
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+
+import django
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import CommandError
+from django.db import models
+from django.forms import modelform_factory
+
+from main.forms import (
+    CharacterDataEffectsForm,
+    CharacterDataFiltersForm,
+    CharacterDataPlanFiltersForm,
+    PlaceForm,
+    PlanLockForm,
+    PlanPlaceFiltersForm,
+    SettlementPositionForm
+)
+from main.management.base import PhasedCommand
+from main.models import (
+    CharacterDataEffects,
+    CharacterDataFilters,
+    CharacterDataPlanFilters,
+    Place,
+    PlanLock,
+    PlanPlaceFilters,
+    SettlementPosition,
+    char_fields
+)
+from main.utils import check_characters_modifiers, check_modifiers
+
+# admin forms, stored JSON fields are checked by their clean_<field name> methods
+FILTERS_FORMS = {
+    CharacterDataEffects: CharacterDataEffectsForm,
+    CharacterDataFilters: CharacterDataFiltersForm,
+    CharacterDataPlanFilters: CharacterDataPlanFiltersForm,
+    PlanPlaceFilters: PlanPlaceFiltersForm,
+    PlanLock: PlanLockForm,
+    Place: PlaceForm,
+    SettlementPosition: SettlementPositionForm,
+}
+# modifiers fields without form cleaners
+MODIFIERS_CHECKS = {
+    CharacterDataFilters: {
+        'plan_points_mods': partial(check_characters_modifiers, fields=char_fields),
+        'acceptance_points_base': partial(check_characters_modifiers, fields=char_fields),
+        'acceptance_points_mods': partial(check_characters_modifiers, fields=char_fields),
+    },
+    SettlementPosition: {
+        'points_mods': partial(check_modifiers, fields=char_fields),
+    },
+}
+FILTERS_MODELS_BY_NAME = {model.__name__: model for model in FILTERS_FORMS}
+
+
+def get_checked_fields(model):
+    form_class = FILTERS_FORMS[model]
+    modifiers_checks = MODIFIERS_CHECKS.get(model, {})
+    return [
+        field.name for field in model._meta.get_fields()  # noqa
+        if isinstance(field, models.JSONField)
+        and (hasattr(form_class, f'clean_{field.name}') or field.name in modifiers_checks)
+    ]
+
+
+def get_checks(model, field_names):
+    """{field name: check(data)}, form cleaners read the data from cleaned_data."""
+    form = modelform_factory(model, form=FILTERS_FORMS[model], fields=field_names)()
+    modifiers_checks = MODIFIERS_CHECKS.get(model, {})
+
+    def clean(field_name, data):
+        form.cleaned_data = {field_name: data}
+        return getattr(form, f'clean_{field_name}')()
+
+    return {
+        field_name: modifiers_checks.get(field_name) or partial(clean, field_name) for field_name in field_names
+    }
+
+
+def validate_rows(model_name, field_names, rows):
+    """Errors as (id, field name, message) for rows of (id, *values of field_names)."""
+    checks = get_checks(FILTERS_MODELS_BY_NAME[model_name], field_names)
+    errors = []
+    for row_id, *values in rows:
+        for field_name, data in zip(field_names, values):
+            if not data:
+                continue
+            try:
+                checks[field_name](data)
+            except ValidationError as e:
+                errors.append((row_id, field_name, '; '.join(e.messages)))
+            except (AttributeError, TypeError, ValueError) as e:
+                errors.append((row_id, field_name, f'Wrong format: {e}'))
+    return errors
+
+
+def iter_rows(queryset, field_names, chunk_size):
+    rows = []
+    for row in queryset.values_list('id', *field_names).iterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) == chunk_size:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+
+class Command(PhasedCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per validated chunk.')
+        parser.add_argument(
+            '--parallel-min-rows', type=int, default=20000, help='Validate tables with more rows in a process pool.'
+        )
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Process pool size.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Start')
+        chunk_size = options['chunk_size']
+        errors = []
+        rows_count = 0
+        executor = None
+        try:
+            for model in FILTERS_FORMS:
+                field_names = get_checked_fields(model)
+                with self.phase(model.__name__):
+                    model_rows_count = model.objects.count()
+                    rows_count += model_rows_count
+                    chunks = iter_rows(model.objects.order_by('id'), field_names, chunk_size)
+                    if model_rows_count < options['parallel_min_rows'] or options['workers'] < 2:
+                        for rows in chunks:
+                            errors.extend((model, *error) for error in validate_rows(model.__name__, field_names, rows))
+                        continue
+                    if not executor:
+                        executor = ProcessPoolExecutor(options['workers'], initializer=django.setup)
+                    # a few chunks in flight per worker, the rest of the table is read as they complete
+                    model_errors = []
+                    pending = set()
+                    for rows in chunks:
+                        if len(pending) >= 2 * options['workers']:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                model_errors.extend(future.result())
+                        pending.add(executor.submit(validate_rows, model.__name__, field_names, rows))
+                    for future in wait(pending).done:
+                        model_errors.extend(future.result())
+                    model_errors.sort(key=lambda error: error[0])
+                    errors.extend((model, *error) for error in model_errors)
+        finally:
+            if executor:
+                executor.shutdown()
+
+        for model, row_id, field_name, message in errors:
+            self.stdout.write(f'{model.__name__}({row_id}).{field_name}: {message}')
+        self.stdout.write(f'Rows: {rows_count}, invalid: {len(errors)}')
+        if errors:
+            raise CommandError(f'Found {len(errors)} invalid filters')
+        self.stdout.write('Done')
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from main.instrumentation import instrument, logger
+
+
+class QueryInstrumentationMiddleware:
+    """Logs the queries and cache hits of every request and checks QUERY_BUDGETS, enabled by QUERY_INSTRUMENTATION."""
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with instrument(request.path) as instrumentation:
+            response = self.get_response(request)
+        logger.info(instrumentation.get_report())
+        response['Server-Timing'] = instrumentation.get_server_timing()
+        instrumentation.check_budget()
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-19 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='relationships_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Attrs used for the last relationships build, the character is rebuilt when they changed.', max_length=50),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.3 on 2026-10-19 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_character_relationships_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_timestamp', models.PositiveIntegerField()),
+                ('to_timestamp', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EventRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('plan', 'Plan'), ('character', 'Character'), ('place', 'Place'), ('hour', 'Hour')], max_length=20)),
+                ('key', models.PositiveIntegerField(help_text='Plan, character or place id, or hour from the game start.')),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['first_character', 'timestamp'], name='main_eventl_first_c_3d4cb6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['plan', 'timestamp'], name='main_eventl_plan_id_46d366_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['timestamp'], name='main_eventl_timesta_288087_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventrollup',
+            unique_together={('dimension', 'key')},
+        ),
+    ]
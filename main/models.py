@@ -3,9 +3,11 @@ from datetime import timedelta
 from django.core.cache import cache
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils.functional import SimpleLazyObject
 
 from main.utils import (
     DescMixin,
+    EVENT_ROLLUP_DIMENSION_CHOICES,
     HAIR_COLOR_CHOICES,
     HAIRSTYLE_CHOICES,
     LABELS_VALUES,
@@ -558,6 +560,8 @@ class PlanPause(models.Model, DescMixin):
 
 
 class Character(models.Model):
+    not_exported_fields = ['relationships_fingerprint']
+
     title = models.CharField(max_length=50, unique=True)
     is_original = models.BooleanField(default=True, blank=True)
     is_chained = models.BooleanField(default=False, blank=True)
@@ -602,12 +606,25 @@ class Character(models.Model):
     pride = models.PositiveSmallIntegerField(
         default=500, validators=[MinValueValidator(100), MaxValueValidator(1000)]
     )
+    relationships_fingerprint = models.CharField(
+        max_length=50,
+        blank=True,
+        editable=False,
+        help_text='Attrs used for the last relationships build, the character is rebuilt when they changed.'
+    )
 
     def __str__(self):
         return '{}{}'.format(self.first_name, f' {self.last_name}' if self.last_name else '')
 
 
 class EventLog(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['first_character', 'timestamp']),
+            models.Index(fields=['plan', 'timestamp']),
+            models.Index(fields=['timestamp']),
+        ]
+
     is_important = models.BooleanField(default=False)
     timestamp = models.PositiveIntegerField()
     plan = models.ForeignKey('Plan', models.SET_NULL, null=True)
@@ -622,9 +639,39 @@ class EventLog(models.Model):
     def __str__(self):
         return '{}: {}{} - {}'.format(
             timedelta(seconds=self.timestamp),
-            self.first_character.title,
+            self.first_character.title if self.first_character else '-',
             '({})'.format(self.second_character.title) if self.second_character else '',
-            self.plan.title
+            self.plan.title if self.plan else '-'
+        )
+
+
+class EventRollup(models.Model):
+    """Events count per plan, first character, place or in-game hour, including archived events."""
+    class Meta:
+        unique_together = ['dimension', 'key']
+
+    is_exported = False
+
+    dimension = models.CharField(choices=EVENT_ROLLUP_DIMENSION_CHOICES, max_length=20)
+    key = models.PositiveIntegerField(help_text='Plan, character or place id, or hour from the game start.')
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.dimension} {self.key}: {self.count}'
+
+
+class EventLogArchive(models.Model):
+    """Archived events as zlib compressed JSON list of EventLog values."""
+    is_exported = False
+
+    from_timestamp = models.PositiveIntegerField()
+    to_timestamp = models.PositiveIntegerField()
+    count = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    def __str__(self):
+        return '{} - {} ({})'.format(
+            timedelta(seconds=self.from_timestamp), timedelta(seconds=self.to_timestamp), self.count
         )
 
 
@@ -787,11 +834,12 @@ class SettlementPosition(models.Model):
         return self.title
 
 
-char_fields = get_fields_data(Character)
-place_fields = get_fields_data(Place)
-plan_fields = get_fields_data(Plan)
-settlement_fields = get_fields_data(Settlement)
-position_fields = get_fields_data(SettlementPosition)
-char_attrs_ranged = tuple(
+# computed on the first use, importing the models stays cheap
+char_fields = SimpleLazyObject(lambda: get_fields_data(Character))
+place_fields = SimpleLazyObject(lambda: get_fields_data(Place))
+plan_fields = SimpleLazyObject(lambda: get_fields_data(Plan))
+settlement_fields = SimpleLazyObject(lambda: get_fields_data(Settlement))
+position_fields = SimpleLazyObject(lambda: get_fields_data(SettlementPosition))
+char_attrs_ranged = SimpleLazyObject(lambda: tuple(
     name for name, ranges in char_fields.items() if ranges['min'] == 100 and ranges['max'] == 1000
-)
+))
@@ -0,0 +1,108 @@
+import json
+
+from functools import lru_cache
+
+import numpy as np
+
+from main.models import char_attrs_ranged
+
+REDUCTIONS = {
+    'max': lambda values: values.max(axis=1),
+    'min': lambda values: values.min(axis=1),
+    'avg': lambda values: values.mean(axis=1),
+}
+
+
+def get_factors(values, is_positive):
+    """Attr value 800 gives 1.3 for positive and 0.7 for negative modifier, range is 0.6-1.5."""
+    return values / 1000 + 0.5 if is_positive else 1.5 - values / 1000
+
+
+class Modifiers:
+    """
+    Points modifiers spec ({"positive": {"other": {"max": ["sleep", "health"], "exact": "energy"}}})
+    compiled over stats matrices with rows of objects and columns in attrs order.
+    Every max/min/avg/exact part gives a factor, all factors are multiplied.
+    Specs without own/other (place and position modifiers) are applied to own stats.
+    """
+    def __init__(self, mods, attrs=char_attrs_ranged):
+        self.attrs = tuple(attrs)
+        self.own = []
+        self.other = []
+        for pos_neg in ['positive', 'negative']:
+            pos_neg_data = mods.get(pos_neg)
+            if not pos_neg_data:
+                continue
+            is_positive = pos_neg == 'positive'
+            if 'own' in pos_neg_data or 'other' in pos_neg_data:
+                self.add_parts(self.own, pos_neg_data.get('own'), is_positive)
+                self.add_parts(self.other, pos_neg_data.get('other'), is_positive)
+            else:
+                self.add_parts(self.own, pos_neg_data, is_positive)
+
+    def add_parts(self, parts, mod_data, is_positive):
+        if not mod_data:
+            return
+        for reduction in ['max', 'min', 'avg']:
+            if mod_data.get(reduction):
+                parts.append((is_positive, reduction, [self.get_index(attr) for attr in mod_data[reduction]]))
+        if mod_data.get('exact'):
+            parts.append((is_positive, 'exact', self.get_index(mod_data['exact'])))
+
+    def get_index(self, attr):
+        if attr not in self.attrs:
+            raise ValueError(f'Attr not found: "{attr}"')
+        return self.attrs.index(attr)
+
+    @staticmethod
+    def get_parts_factors(parts, stats):
+        stats = np.atleast_2d(stats)
+        factors = np.ones(len(stats))
+        for is_positive, reduction, indexes in parts:
+            if reduction == 'exact':
+                values = stats[:, indexes]
+            else:
+                values = REDUCTIONS[reduction](stats[:, indexes])
+            factors *= get_factors(values, is_positive)
+        return factors
+
+    def evaluate(self, stats, other_stats=None):
+        """
+        Modifier of every row of stats, other_stats is one row for every stats row or a single row
+        (the same other object), stats are used as other_stats if not set.
+        """
+        factors = self.get_parts_factors(self.own, stats)
+        if self.other:
+            factors *= self.get_parts_factors(self.other, stats if other_stats is None else other_stats)
+        return factors
+
+    def evaluate_pairs(self, stats, other_stats=None):
+        """Matrix of modifiers of every stats row (own) with every other_stats row (other)."""
+        own = self.get_parts_factors(self.own, stats)
+        other = self.get_parts_factors(self.other, stats if other_stats is None else other_stats)
+        return np.outer(own, other)
+
+
+@lru_cache(maxsize=1024)
+def compile_modifiers_json(mods_json, attrs):
+    return Modifiers(json.loads(mods_json), attrs)
+
+
+def compile_modifiers(mods, attrs=char_attrs_ranged):
+    return compile_modifiers_json(json.dumps(mods, sort_keys=True), tuple(attrs))
+
+
+def load_stats(queryset, attrs=char_attrs_ranged):
+    """Ids and stats matrix (rows of objects, columns in attrs order)."""
+    rows = list(queryset.order_by('id').values_list('id', *attrs))
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, len(attrs)))
+    data = np.array(rows, dtype=np.float64)
+    return data[:, 0].astype(np.int64), data[:, 1:]
+
+
+def get_top(ids, values, count):
+    """Ids of count highest values, highest first."""
+    count = min(count, len(values))
+    indexes = np.argpartition(-values, count - 1)[:count] if count else np.zeros(0, dtype=np.int64)
+    return ids[indexes[np.argsort(-values[indexes], kind='stable')]]
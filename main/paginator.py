@@ -0,0 +1,172 @@
+import base64
+import binascii
+import json
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+COUNT_LIMIT = 100000
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise IncorrectLookupParameters(f'Wrong cursor: {cursor}')
+
+
+def get_seek_q(columns, values, nulls_largest):
+    """
+    Rows after the values in (attname, is_descending) columns order, NULLs are compared like the database orders
+    them: (a > x) | (a = x & b > y) | (a = x & b = y & c > z)...
+    """
+    query = Q(pk__in=[])
+    equal = Q()
+    for (attname, is_descending), value in zip(columns, values):
+        # NULLs come after all values if the database orders them as largest ascending or as smallest descending
+        is_nulls_after = nulls_largest != is_descending
+        if value is None:
+            after = Q(pk__in=[]) if is_nulls_after else Q(**{f'{attname}__isnull': False})
+            query |= equal & after
+            equal &= Q(**{f'{attname}__isnull': True})
+        else:
+            after = Q(**{f'{attname}__{"lt" if is_descending else "gt"}': value})
+            if is_nulls_after:
+                after |= Q(**{f'{attname}__isnull': True})
+            query |= equal & after
+            equal &= Q(**{attname: value})
+    return query
+
+
+class EstimatedCountPaginator(Paginator):
+    """Counts up to count_limit rows, bigger counts are estimated from the table statistics if possible."""
+    count_limit = COUNT_LIMIT
+    is_estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        count = queryset.order_by()[:self.count_limit + 1].count()
+        if count <= self.count_limit:
+            return count
+        self.is_estimated = True
+        return max(self.count_limit, self.get_table_estimate(queryset) or 0)
+
+    @staticmethod
+    def get_table_estimate(queryset):
+        """Rows in the whole table from PostgreSQL statistics, for unfiltered querysets only."""
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row else None
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist paging by seeking from the first or last row values of the ordering columns ("?after=<cursor>"),
+    so every page costs the same as the first one. Orderings by relations or expressions use offset pages.
+    """
+    is_keyset = False
+    next_url = None
+    previous_url = None
+    first_url = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        for name in (AFTER_VAR, BEFORE_VAR):
+            lookup_params.pop(name, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        """Sorting and filtering links start from the first page."""
+        if not new_params or not {AFTER_VAR, BEFORE_VAR} & set(new_params):
+            remove = [*(remove or []), AFTER_VAR, BEFORE_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_keyset_columns(self):
+        """(attname, is_descending) of the queryset ordering, None if it isn't by own fields."""
+        columns = []
+        opts = self.lookup_opts
+        for name in self.queryset.query.order_by:
+            if not isinstance(name, str) or name == '?':
+                return None
+            is_descending = name.startswith('-')
+            name = name.lstrip('-')
+            if '__' in name:
+                return None
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete:
+                return None
+            if field.attname not in {attname for attname, _ in columns}:
+                columns.append((field.attname, is_descending))
+        return columns
+
+    def get_results(self, request):
+        columns = self.get_keyset_columns()
+        if not columns or (PAGE_VAR in self.params and not {AFTER_VAR, BEFORE_VAR} & set(self.params)):
+            return super().get_results(request)
+
+        after, before = self.params.get(AFTER_VAR), self.params.get(BEFORE_VAR)
+        cursor = before or after
+        # foreign keys are ordered by ids to match their indexes and the cursor values
+        queryset = self.queryset.order_by(*[f'{"-" if desc else ""}{attname}' for attname, desc in columns])
+        if cursor:
+            values = decode_cursor(cursor)
+            if not isinstance(values, list) or len(values) != len(columns):
+                raise IncorrectLookupParameters(f'Wrong cursor: {cursor}')
+            nulls_largest = connections[queryset.db].features.nulls_order_largest
+            if before:
+                queryset = queryset.reverse()
+                columns_seek = [(attname, not desc) for attname, desc in columns]
+            else:
+                columns_seek = columns
+            queryset = queryset.filter(get_seek_q(columns_seek, values, nulls_largest))
+        result_list = list(queryset[:self.list_per_page + 1])
+        has_more = len(result_list) > self.list_per_page
+        result_list = result_list[:self.list_per_page]
+        if before:
+            result_list.reverse()
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = result_list
+        self.can_show_all = False
+        self.paginator = paginator
+        self.is_keyset = True
+
+        has_next = has_more if not before else True
+        has_previous = bool(after) or (bool(before) and has_more)
+        self.multi_page = has_next or has_previous
+        if result_list and has_next:
+            self.next_url = self.get_page_url(AFTER_VAR, self.get_cursor(result_list[-1], columns))
+        if result_list and has_previous:
+            self.previous_url = self.get_page_url(BEFORE_VAR, self.get_cursor(result_list[0], columns))
+            self.first_url = self.get_query_string(remove=[PAGE_VAR])
+
+    @staticmethod
+    def get_cursor(obj, columns):
+        return encode_cursor([getattr(obj, attname) for attname, _ in columns])
+
+    def get_page_url(self, name, cursor):
+        return self.get_query_string({name: cursor}, [AFTER_VAR if name == BEFORE_VAR else BEFORE_VAR, PAGE_VAR])
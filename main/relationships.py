@@ -0,0 +1,165 @@
+from itertools import islice
+
+import numpy as np
+
+RELATIONSHIP_ATTRS = ('intelligence', 'pride')
+# more changed characters are rebuilt fully, also keeps the from and to "__in" lists of one query under
+# sqlite 999 parameters limit
+INCREMENTAL_CHANGED_MAX = 450
+
+
+def get_opinion(first, second, is_negative=True, is_difference=True, first_mod=.5, second_mod=1.5):
+    opinion = 0
+    if first > 500 and second > 500:
+        opinion = (first * first_mod + second * second_mod) - 1000
+    elif is_negative and first < 500 and second < 500:
+        opinion = 1000 - (first * first_mod + second * second_mod)
+    elif is_difference and (first > 500 > second or first < 500 < second):
+        opinion = -abs(first - second)
+    else:
+        return opinion
+    return opinion / 2  # values should be in range 0-500
+
+
+def get_opinions(first, second, is_negative=True, is_difference=True, first_mod=.5, second_mod=1.5):
+    """Array version of get_opinion, arguments are broadcast against each other."""
+    weighted = first * first_mod + second * second_mod
+    opinions = np.select(
+        [
+            (first > 500) & (second > 500),
+            (first < 500) & (second < 500) & is_negative,
+            ((first > 500) & (second < 500) | (first < 500) & (second > 500)) & is_difference
+        ],
+        [weighted - 1000, 1000 - weighted, -np.abs(first - second)],
+        default=0
+    )
+    return opinions / 2
+
+
+def get_relationship_values(first_attrs, second_attrs):
+    """Relationship values for attrs arrays with RELATIONSHIP_ATTRS as the last axis."""
+    opinions = 500
+    for i in range(len(RELATIONSHIP_ATTRS)):
+        opinions = opinions + get_opinions(first_attrs[..., i], second_attrs[..., i]) * .2
+    return np.clip(opinions, 100, 1000).astype(np.int64)
+
+
+def load_array(rows, columns, chunk_size=100000):
+    chunks = []
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        chunks.append(np.array(chunk, dtype=np.int64).reshape(-1, columns))
+    if not chunks:
+        return np.empty((0, columns), dtype=np.int64)
+    return np.concatenate(chunks)
+
+
+def load_attrs(queryset):
+    """Ids sorted ascending and matching (n, len(RELATIONSHIP_ATTRS)) attrs matrix."""
+    rows = queryset.order_by('id').values_list('id', *RELATIONSHIP_ATTRS).iterator()
+    data = load_array(rows, 1 + len(RELATIONSHIP_ATTRS))
+    return data[:, 0], data[:, 1:]
+
+
+def load_relationships(queryset, from_field, to_field):
+    """Existing relationships as (from_ids, to_ids, values, ids) arrays."""
+    data = load_array(queryset.values_list(from_field, to_field, 'value', 'id').iterator(), 4)
+    return data[:, 0], data[:, 1], data[:, 2], data[:, 3]
+
+
+def get_indexes(ids, values):
+    """Positions of values in sorted ids, -1 if value is missing."""
+    indexes = np.searchsorted(ids, values)
+    indexes[indexes == len(ids)] = 0
+    found = ids[indexes] == values if len(ids) else np.zeros(len(values), dtype=bool)
+    return np.where(found, indexes, -1)
+
+
+def get_fingerprints(attrs):
+    return ['_'.join(map(str, row)) for row in attrs.tolist()]
+
+
+class RelationshipsDiff:
+    """
+    Creates, updates and deletes needed to bring relationships in line with attrs.
+    With changed indexes only their rows and columns are checked, other pairs are treated as up to date.
+    With default (sparse mode) pairs with the default value are not stored.
+    """
+    def __init__(self, ids, attrs, relationships, changed=None, default=None, block_size=512):
+        self.ids = ids
+        self.attrs = attrs
+        self.default = default
+        self.block_size = block_size
+        if changed is None:
+            self.regions = [(np.arange(len(ids)), np.arange(len(ids)))]
+        else:
+            unchanged = np.setdiff1d(np.arange(len(ids)), changed)
+            self.regions = [(changed, np.arange(len(ids))), (unchanged, changed)]
+
+        from_ids, to_ids, values, pks = relationships
+        from_indexes = get_indexes(ids, from_ids)
+        to_indexes = get_indexes(ids, to_ids)
+        known = (from_indexes >= 0) & (to_indexes >= 0) & (from_indexes != to_indexes)
+        from_indexes, to_indexes, values, pks = from_indexes[known], to_indexes[known], values[known], pks[known]
+
+        # sorted from * n + to keys instead of an n x n matrix, blocks look their pairs up
+        self.existing_keys = np.unique(from_indexes * len(ids) + to_indexes)
+
+        values_new = get_relationship_values(attrs[from_indexes], attrs[to_indexes])
+        changed = values_new != values
+        if default is None:
+            self.delete_pks = pks[:0]
+        else:
+            is_default = values_new == default
+            self.delete_pks = pks[is_default]
+            changed &= ~is_default
+        self.update_pks = pks[changed]
+        self.update_values = values_new[changed]
+
+    @property
+    def creates_count(self):
+        if self.default is not None:
+            return sum(len(values) for _, _, values in self.iter_creates())
+        return sum(
+            int(np.count_nonzero(~self.get_existing(rows[start:start + self.block_size], columns)))
+            for rows, columns in self.regions for start in range(0, len(rows), self.block_size)
+        )
+
+    def get_existing(self, rows, columns):
+        """(rows, columns) mask of pairs with a relationship, pairs of a character with itself included."""
+        keys = rows[:, None] * len(self.ids) + columns[None, :]
+        existing = rows[:, None] == columns[None, :]
+        if len(self.existing_keys):
+            positions = np.searchsorted(self.existing_keys, keys)
+            positions[positions == len(self.existing_keys)] = 0
+            existing |= self.existing_keys[positions] == keys
+        return existing
+
+    def iter_creates(self):
+        """Blocks of (from_ids, to_ids, values) for pairs without relationship."""
+        for rows, columns in self.regions:
+            for start in range(0, len(rows), self.block_size):
+                block_rows = rows[start:start + self.block_size]
+                missing_rows, missing_columns = np.nonzero(~self.get_existing(block_rows, columns))
+                if not len(missing_rows):
+                    continue
+                values = get_relationship_values(self.attrs[block_rows, None, :], self.attrs[None, columns, :])
+                values = values[missing_rows, missing_columns]
+                if self.default is not None:
+                    is_stored = values != self.default
+                    missing_rows, missing_columns, values = (
+                        missing_rows[is_stored], missing_columns[is_stored], values[is_stored]
+                    )
+                yield self.ids[block_rows[missing_rows]], self.ids[columns[missing_columns]], values
+
+
+def iter_chunks(items, chunk_size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
@@ -1,14 +1,46 @@
-from django.apps import apps
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from django.core.cache import cache
-from django.db.models.signals import post_save
-from main.models import Stage
+from django.db.models.signals import post_delete, post_save
+from main.graph import clear_graph
+from main.models import Place, PlaceTransition, Stage
+
+cache_clear_state = ContextVar('cache_clear_state', default=None)
+
+
+@contextmanager
+def suppress_cache_clear():
+    """Saves inside only mark the cache as stale, it is cleared once on exit."""
+    if cache_clear_state.get() is not None:
+        yield
+        return
+    state = {'is_pending': False}
+    token = cache_clear_state.set(state)
+    try:
+        yield
+    finally:
+        cache_clear_state.reset(token)
+        if state['is_pending']:
+            clear_cache_post_save()
 
 
 def clear_cache_post_save(**_):
+    state = cache_clear_state.get()
+    if state is not None:
+        state['is_pending'] = True
+        return
     cache.clear()
+    clear_graph()
     for stage in Stage.objects.all():
         str(stage)
 
 
-for model in apps.all_models['main'].values():
-    post_save.connect(clear_cache_post_save, sender=model)
+def clear_cache_post_main_save(sender, **_):
+    if sender._meta.app_label == 'main':  # noqa
+        clear_cache_post_save()
+
+
+post_save.connect(clear_cache_post_main_save)
+for model in (Place, PlaceTransition):
+    post_delete.connect(clear_graph, sender=model)
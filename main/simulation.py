@@ -0,0 +1,265 @@
+"""
+Headless approximation of the game loop over exported data (db_to_json format), for balancing:
+idle characters start the available plan with most points (plan_points_mods, min_points, time filters,
+character filters), every tick moves active characters one stage further, stage filters break the plan,
+stage effects (all effects of the first character effects set) are applied with the effects preview rules.
+Second characters, routes, locks, pauses and places choice are not simulated, so characters are independent
+and can be partitioned across processes.
+"""
+import json
+import operator
+
+from collections import Counter
+
+import django
+import numpy as np
+
+from django.apps import apps
+
+from main.effects import NEEDS_ATTRS, apply_effect, get_numeric_effects
+from main.eligibility import get_dynamic_char_fields, is_static_item
+from main.filters import FilterContext, compile_filter, get_filter_groups
+from main.models import Plan, char_attrs_ranged, char_fields
+from main.modifiers import compile_modifiers
+from main.utils import PLAYER_ID, parse_filter
+
+WORLD_MODELS = (
+    'Character', 'CharacterDataEffects', 'CharacterDataFilters', 'Faction', 'Place', 'Plan', 'PlanEffects',
+    'PlanEffectsSet', 'PlanFilters', 'Settlement', 'SettlementPosition', 'Stage'
+)
+SIMULATED_ATTRS = (*char_attrs_ranged, 'gold')
+SEED_STEP = 7919
+ARRAY_OPERATORS = {
+    'exact': operator.eq,
+    'ne': operator.ne,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+_world = None
+
+
+def load_world(db_path):
+    """{model name: {id: object}} with defaults for missing fields and relations of characters for filters."""
+    world = {'related': {}}
+    mto_data = {}
+    for name in WORLD_MODELS:
+        # only the exported tables, other files (eligibility.json) can be in the same directory
+        db_table = apps.get_model('main', name)._meta.db_table  # noqa
+        path = db_path / f'{db_table}.json'
+        if not path.exists():
+            continue
+        with open(path) as f:
+            data = json.load(f)
+        defaults = {
+            data['mto_data'][k]['from_id'] if k in data['mto_data'] else k: v for k, v in data['defaults'].items()
+        }
+        world[data['name']] = {int(k): {**defaults, **obj} for k, obj in data['objects'].items()}
+        mto_data[data['name']] = data['mto_data']
+    for name, relation in mto_data.get('Character', {}).items():
+        world['related'][name] = world.get(relation['model'], {})
+    return world
+
+
+def split_filters(filters, dynamic_fields):
+    """
+    Filters parts: static (not changing during simulation), array items (comparisons of simulated attrs
+    with numbers as (column, operator, value)) and the rest evaluated per character.
+    """
+    items, or_groups = get_filter_groups(filters)
+    static_filters, array_items, rest_filters = {}, [], {}
+    for lookup, value in items:
+        relations, field_name, cmd = parse_filter(lookup)
+        if is_static_item(lookup, value, dynamic_fields):
+            static_filters[lookup] = value
+        elif (
+            not relations and field_name in SIMULATED_ATTRS and cmd in ARRAY_OPERATORS
+            and isinstance(value, (int, float)) and not isinstance(value, bool)
+        ):
+            array_items.append((SIMULATED_ATTRS.index(field_name), ARRAY_OPERATORS[cmd], value))
+        else:
+            rest_filters[lookup] = value
+    for alternatives in or_groups:
+        group_items = [item for alternative in alternatives for item in alternative]
+        if all(is_static_item(lookup, value, dynamic_fields) for lookup, value in group_items):
+            static_filters.update(group_items)
+        else:
+            rest_filters.update(group_items)
+    return static_filters, array_items, rest_filters
+
+
+def init_worker(world):
+    global _world
+    django.setup()
+    _world = world
+
+
+class Simulation:
+    def __init__(self, world, chars, seed, tick_minutes, is_events=False):
+        self.world = world
+        self.is_events = is_events
+        self.chars = chars
+        self.rand = np.random.default_rng(seed)
+        self.tick_seconds = tick_minutes * 60
+        self.context = FilterContext(related=world['related'])
+        self.stats = np.array([[char[attr] for attr in SIMULATED_ATTRS] for char in chars], dtype=np.float64)
+        self.ranges = [(char_fields[attr]['min'], char_fields[attr]['max']) for attr in SIMULATED_ATTRS]
+        self.plans = [plan for plan_id, plan in sorted(world['Plan'].items()) if plan['is_char_available']]
+        self.plans_stages = {
+            plan['id']: [world['Stage'][plan[f'{k}_id']] for k in Plan.stages if plan[f'{k}_id']]
+            for plan in self.plans
+        }
+        self.plan_indexes = np.full(len(chars), -1)
+        self.stage_indexes = np.zeros(len(chars), dtype=np.int64)
+        self.counts = Counter()
+        self.events = []
+        self.dynamic_fields = get_dynamic_char_fields()
+        self.filters_parts = {}
+
+    def get_char_filters(self, filters_id):
+        plan_filters = self.world['PlanFilters'].get(filters_id) if filters_id else None
+        if not plan_filters or not plan_filters['first_character_id']:
+            return None
+        return self.world['CharacterDataFilters'].get(plan_filters['first_character_id'])
+
+    def is_time_available(self, filters_id, day_seconds):
+        plan_filters = self.world['PlanFilters'].get(filters_id) if filters_id else None
+        if not plan_filters:
+            return True
+        time_from, time_to = plan_filters['time_from_seconds'], plan_filters['time_to_seconds']
+        if time_from is not None and time_to is not None and time_from > time_to:
+            return day_seconds >= time_from or day_seconds < time_to
+        return (time_from is None or day_seconds >= time_from) and (time_to is None or day_seconds < time_to)
+
+    def sync_chars(self, indexes):
+        for i, values in zip(indexes.tolist(), np.rint(self.stats[indexes]).astype(np.int64).tolist()):
+            self.chars[i].update(zip(SIMULATED_ATTRS, values))
+
+    def get_filters_parts(self, filters):
+        """Static mask of all characters, array items and predicate of the rest, computed once per filters."""
+        key = json.dumps(filters, sort_keys=True)
+        if key not in self.filters_parts:
+            static_filters, array_items, rest_filters = split_filters(filters, self.dynamic_fields)
+            static_mask = self.get_predicate_mask(static_filters, np.arange(len(self.chars)), is_sync=False)
+            self.filters_parts[key] = static_mask, array_items, rest_filters
+        return self.filters_parts[key]
+
+    def get_predicate_mask(self, filters, indexes, is_sync=True):
+        if not filters:
+            return np.ones(len(indexes), dtype=bool)
+        if is_sync:
+            self.sync_chars(indexes)
+        predicate = compile_filter(filters)
+        mask = np.zeros(len(indexes), dtype=bool)
+        for n, i in enumerate(indexes.tolist()):
+            self.context.char = self.chars[i]
+            mask[n] = predicate(self.chars[i], self.context)
+        return mask
+
+    def get_filter_mask(self, filters, indexes):
+        if not filters:
+            return np.ones(len(indexes), dtype=bool)
+        static_mask, array_items, rest_filters = self.get_filters_parts(filters)
+        mask = static_mask[indexes]
+        for column, compare, value in array_items:
+            mask &= compare(np.rint(self.stats[indexes, column]), value)
+        if rest_filters and mask.any():
+            mask[mask] = self.get_predicate_mask(rest_filters, indexes[mask])
+        return mask
+
+    def select_plans(self, indexes, day_seconds):
+        stats = self.stats[indexes][:, :len(char_attrs_ranged)]
+        scores = np.full((len(self.plans), len(indexes)), -np.inf)
+        for n, plan in enumerate(self.plans):
+            if not self.is_time_available(plan['filters_id'], day_seconds):
+                continue
+            char_filters = self.get_char_filters(plan['filters_id'])
+            points = np.full(len(indexes), 500.0)
+            if char_filters and char_filters['plan_points_mods']:
+                points = np.clip(500 * compile_modifiers(char_filters['plan_points_mods']).evaluate(stats), 100, 1000)
+            mask = (points >= plan['min_points']) & self.get_filter_mask(
+                char_filters['filters'] if char_filters else None, indexes
+            )
+            scores[n] = np.where(mask, points + self.rand.uniform(0, 50, len(indexes)), -np.inf)
+        selected = scores.argmax(axis=0)
+        is_selected = np.isfinite(scores[selected, np.arange(len(indexes))])
+        for plan_index in selected[is_selected].tolist():
+            self.counts[(self.plans[plan_index]['id'], 'started')] += 1
+        self.plan_indexes[indexes[is_selected]] = selected[is_selected]
+        self.stage_indexes[indexes[is_selected]] = 0
+
+    def apply_effects(self, effects_id, indexes):
+        plan_effects = self.world['PlanEffects'].get(effects_id)
+        effects_set = self.world['PlanEffectsSet'].get(plan_effects['first_character_id']) if plan_effects else None
+        if not effects_set:
+            return
+        for k in Plan.stages:
+            effects = self.world['CharacterDataEffects'].get(effects_set[f'{k}_id'])
+            if not effects:
+                continue
+            for attr, delta in get_numeric_effects(effects['effects'], char_fields).items():
+                if attr not in SIMULATED_ATTRS:
+                    continue
+                column = SIMULATED_ATTRS.index(attr)
+                if attr in NEEDS_ATTRS:
+                    delta *= effects['needs_mods'].get(attr, 1)
+                # stats stay fractional between ticks, they are rounded for filters and the output only
+                self.stats[indexes, column] = apply_effect(
+                    self.stats[indexes, column],
+                    delta,
+                    effects['effects_max'].get(attr),
+                    self.ranges[column],
+                    is_rounded=False
+                )
+
+    def step_stages(self, tick):
+        active = np.flatnonzero(self.plan_indexes >= 0)
+        keys = self.plan_indexes[active] * 8 + self.stage_indexes[active]
+        for key in np.unique(keys).tolist():
+            plan = self.plans[key // 8]
+            stages = self.plans_stages[plan['id']]
+            stage = stages[key % 8]
+            indexes = active[keys == key]
+            char_filters = self.get_char_filters(stage['filters_id'])
+            if char_filters and char_filters['filters']:
+                mask = self.get_filter_mask(char_filters['filters'], indexes)
+                broken = indexes[~mask]
+                self.counts[(plan['id'], 'broken')] += len(broken)
+                self.plan_indexes[broken] = -1
+                indexes = indexes[mask]
+            if stage['effects_id']:
+                self.apply_effects(stage['effects_id'], indexes)
+            self.stage_indexes[indexes] += 1
+            finished = indexes[self.stage_indexes[indexes] >= len(stages)]
+            if len(finished):
+                self.counts[(plan['id'], 'finished')] += len(finished)
+                self.plan_indexes[finished] = -1
+                if self.is_events and not plan['is_ignore_event']:
+                    self.events.extend(
+                        (tick * self.tick_seconds, plan['id'], self.chars[i]['id'], self.chars[i]['place_id'],
+                         plan['is_important_event'])
+                        for i in finished.tolist()
+                    )
+
+    def run(self, ticks):
+        for tick in range(ticks):
+            self.step_stages(tick)
+            idle = np.flatnonzero(self.plan_indexes < 0)
+            if len(idle):
+                self.select_plans(idle, tick * self.tick_seconds % 86400)
+        self.sync_chars(np.arange(len(self.chars)))
+        return np.rint(self.stats)
+
+
+def simulate_partition(chars, seed, ticks, tick_minutes, is_events):
+    simulation = Simulation(_world, chars, seed, tick_minutes, is_events)
+    stats = simulation.run(ticks)
+    return stats, simulation.counts, simulation.events
+
+
+def get_partitions(world, workers):
+    chars = [char for char_id, char in sorted(world['Character'].items()) if char_id != PLAYER_ID]
+    size = max(1, -(-len(chars) // max(1, workers)))
+    return [chars[i:i + size] for i in range(0, len(chars), size)]
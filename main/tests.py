@@ -0,0 +1,57 @@
+import itertools
+import json
+import tempfile
+
+from pathlib import Path
+
+import numpy as np
+
+from django.test import SimpleTestCase
+
+from main.relationships import RELATIONSHIP_ATTRS, get_opinion, get_opinions, get_relationship_values
+from main.simulation import load_world
+
+ATTR_VALUES = np.arange(100, 1001)
+# every 50 and the values around 500, where get_opinion changes its branch
+ATTR_VALUES_SPARSE = np.array(sorted({*range(100, 1001, 50), 499, 500, 501}))
+
+
+class RelationshipsTest(SimpleTestCase):
+    def test_get_opinions(self):
+        first, second = np.meshgrid(ATTR_VALUES, ATTR_VALUES, indexing='ij')
+        for is_negative, is_difference in itertools.product((True, False), repeat=2):
+            with self.subTest(is_negative=is_negative, is_difference=is_difference):
+                opinions = get_opinions(first, second, is_negative=is_negative, is_difference=is_difference)
+                expected = np.array([
+                    [
+                        get_opinion(a, b, is_negative=is_negative, is_difference=is_difference)
+                        for b in ATTR_VALUES.tolist()
+                    ]
+                    for a in ATTR_VALUES.tolist()
+                ])
+                np.testing.assert_array_equal(opinions, expected)
+
+    def test_get_relationship_values(self):
+        attrs = np.array(list(itertools.product(ATTR_VALUES_SPARSE.tolist(), repeat=len(RELATIONSHIP_ATTRS))))
+        values = get_relationship_values(attrs[:, None, :], attrs[None, :, :])
+        for i, first in enumerate(attrs.tolist()):
+            for j, second in enumerate(attrs.tolist()):
+                opinion = 500
+                for a, b in zip(first, second):
+                    opinion += get_opinion(a, b) * .2
+                self.assertEqual(values[i, j], int(min(max(opinion, 100), 1000)), (first, second))
+
+
+class SimulationTest(SimpleTestCase):
+    def test_load_world_skips_other_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = Path(directory)
+            with open(db_path / 'main_faction.json', 'w') as f:
+                json.dump({
+                    'name': 'Faction', 'objects': {'1': {'id': 1, 'title': 'guild'}}, 'mto_data': {}, 'defaults': {}
+                }, f)
+            with open(db_path / 'eligibility.json', 'w') as f:
+                json.dump({'characters_ids': [1], 'plans': {}}, f)
+            world = load_world(db_path)
+        self.assertEqual(world['Faction'], {1: {'id': 1, 'title': 'guild'}})
+        self.assertNotIn('Character', world)
@@ -58,6 +58,12 @@ ROUTE_STATUS_CHOICES = (
     ('not_found', 'Not found'),
     ('locked', 'Locked'),
 )
+EVENT_ROLLUP_DIMENSION_CHOICES = (
+    ('plan', 'Plan'),
+    ('character', 'Character'),
+    ('place', 'Place'),
+    ('hour', 'Hour'),
+)
 
 LABELS_VALUES = {
     100: 'min',
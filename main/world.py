@@ -0,0 +1,345 @@
+"""
+Synthetic worlds for scale tests: regions, settlements with gates and streets, characters with homes
+(build_homes layout), relationships, factions, plans with stages, filters and effects, and event logs.
+Rows get explicit ids after the current maximum ones and are inserted with executemany, skipping models
+instantiation, so 100k characters with their homes are generated in well under a minute.
+"""
+import datetime
+import json
+import random
+
+from collections import Counter
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+from django.db import connection, models
+from django.db.models import Max
+
+from main.events import add_rollups_counts, get_rollups_counts, iter_batches
+from main.management.commands.build_homes import (
+    HOME_ROOMS,
+    get_home_entrance,
+    get_home_plan,
+    get_home_rooms,
+    get_home_transitions
+)
+from main.models import (
+    Character,
+    CharacterDataEffects,
+    CharacterDataFilters,
+    CharacterRelationship,
+    EventLog,
+    EventRollup,
+    Faction,
+    FactionRelationship,
+    Place,
+    PlaceTransition,
+    Plan,
+    PlanEffects,
+    PlanEffectsSet,
+    PlanFilters,
+    Settlement,
+    Stage,
+    char_attrs_ranged
+)
+from main.utils import HAIR_COLOR_CHOICES, HAIRSTYLE_CHOICES, SKIN_COLOR_CHOICES
+
+FIRST_NAMES = {
+    'male': ('Aldric', 'Bram', 'Cedric', 'Doran', 'Edmund', 'Falk', 'Gareth', 'Hugo', 'Ivo', 'Jorund'),
+    'female': ('Adela', 'Brenna', 'Cora', 'Dagny', 'Elin', 'Freya', 'Gisela', 'Helga', 'Ida', 'Juna'),
+}
+LAST_NAMES = ('Ashford', 'Blackwood', 'Crane', 'Dunmore', 'Elwood', 'Fairbairn', 'Greaves', 'Holt', '')
+NEEDS = ('energy', 'sleep', 'mood', 'health')
+SKILLS = ('fighting', 'magic', 'intelligence')
+WORLD_MODELS = (
+    Faction, FactionRelationship, Settlement, Place, PlaceTransition, Character, CharacterRelationship,
+    CharacterDataFilters, CharacterDataEffects, PlanEffectsSet, PlanEffects, PlanFilters, Stage, Plan, EventLog
+)
+
+
+class WorldGenerator:
+    """Rows of WORLD_MODELS as {model: [{attname: value}]}, missing values are the fields defaults."""
+    def __init__(
+        self, characters, settlements=None, streets=5, regions=None, factions=5, plans=30, relationships=5,
+        events=2, days=7, settled_ratio=.9, homes=True, seed=None
+    ):
+        self.rand = random.Random(seed)
+        self.characters_count = characters
+        self.settlements_count = settlements or max(1, characters // 500)
+        self.streets_count = streets
+        self.regions_count = regions or max(2, self.settlements_count)
+        self.factions_count = factions
+        self.plans_count = plans
+        self.relationships_count = relationships
+        self.events_count = events * characters
+        self.days = days
+        self.settled_ratio = settled_ratio
+        self.homes = homes
+        self.rows = {model: [] for model in WORLD_MODELS}
+        self.next_ids = {}
+
+    def add(self, model, row):
+        if model not in self.next_ids:
+            self.next_ids[model] = (model.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        row['id'] = self.next_ids[model]
+        self.next_ids[model] += 1
+        self.rows[model].append(row)
+        return row
+
+    def add_titled(self, model, prefix, row):
+        row = self.add(model, row)
+        row['title'] = f'gen_{prefix}_{row["id"]}'
+        return row
+
+    def add_transition(self, from_place_id, to_place_id, distance):
+        self.add(PlaceTransition, {'from_place_id': from_place_id, 'to_place_id': to_place_id, 'distance': distance})
+
+    def add_transitions(self, first_place, second_place, distance):
+        self.add_transition(first_place['id'], second_place['id'], distance)
+        self.add_transition(second_place['id'], first_place['id'], distance)
+
+    def generate(self):
+        self.generate_factions()
+        self.generate_places()
+        self.generate_characters()
+        if self.homes:
+            self.generate_homes()
+        self.generate_relationships()
+        self.generate_plans()
+        self.generate_events()
+        return self.rows
+
+    def generate_factions(self):
+        self.factions = []
+        for _ in range(self.factions_count):
+            faction = self.add_titled(Faction, 'faction', {})
+            faction['name'] = f'Faction {faction["id"]}'
+            self.factions.append(faction)
+        for from_faction in self.factions:
+            for to_faction in self.factions:
+                if from_faction is not to_faction:
+                    self.add(FactionRelationship, {
+                        'from_faction_id': from_faction['id'],
+                        'to_faction_id': to_faction['id'],
+                        'value': self.rand.randint(100, 1000)
+                    })
+
+    def generate_places(self):
+        """
+        Regions connected in a ring with random shortcuts and to an existing region, settlement gates lead
+        to a region and streets.
+        """
+        self.regions = [
+            self.add_titled(Place, 'region', {
+                'name': 'Region',
+                'place_type': 'region',
+                'beauty': self.rand.randint(300, 1000),
+                'safety': self.rand.randint(500, 1000),
+                'fertility': self.rand.randint(100, 1000)
+            })
+            for _ in range(self.regions_count)
+        ]
+        regions_ids = list(Place.objects.filter(place_type='region').order_by('id').values_list('id', flat=True))
+        if regions_ids:
+            # joins the existing world
+            distance = round(self.rand.uniform(5, 30), 1)
+            self.add_transitions({'id': self.rand.choice(regions_ids)}, self.regions[0], distance)
+        for n, region in enumerate(self.regions[1:], 1):
+            self.add_transitions(self.regions[n - 1], region, round(self.rand.uniform(5, 30), 1))
+        if len(self.regions) > 2:
+            self.add_transitions(self.regions[-1], self.regions[0], round(self.rand.uniform(5, 30), 1))
+            shortcuts = set()
+            for _ in range(len(self.regions) // 4):
+                from_n, to_n = sorted(self.rand.sample(range(len(self.regions)), 2))
+                if 1 < to_n - from_n < len(self.regions) - 1 and (from_n, to_n) not in shortcuts:
+                    shortcuts.add((from_n, to_n))
+                    self.add_transitions(self.regions[from_n], self.regions[to_n], round(self.rand.uniform(10, 50), 1))
+
+        self.settlements = []
+        self.streets = {}
+        for _ in range(self.settlements_count):
+            settlement = self.add_titled(Settlement, 'settlement', {'gold': self.rand.randint(1000, 10000)})
+            self.settlements.append(settlement)
+            gates = self.add_titled(Place, 'gates', {
+                'name': 'Gates', 'place_type': 'settlement_gates', 'settlement_id': settlement['id']
+            })
+            self.add_transitions(self.rand.choice(self.regions), gates, round(self.rand.uniform(1, 5), 1))
+            streets = []
+            for _ in range(self.streets_count):
+                street = self.add_titled(Place, 'street', {
+                    'name': 'Street',
+                    'place_type': 'street',
+                    'settlement_id': settlement['id'],
+                    'beauty': self.rand.randint(100, 1000),
+                    'safety': self.rand.randint(300, 1000)
+                })
+                self.add_transitions(streets[-1] if streets else gates, street, round(self.rand.uniform(.1, .5), 2))
+                streets.append(street)
+            if len(streets) > 2:
+                self.add_transitions(streets[0], streets[-1], round(self.rand.uniform(.1, .5), 2))
+            self.streets[settlement['id']] = streets
+
+    def generate_characters(self):
+        self.characters = []
+        for _ in range(self.characters_count):
+            gender = self.rand.choice(('male', 'female'))
+            settlement = self.rand.choice(self.settlements) if self.rand.random() < self.settled_ratio else None
+            place = self.rand.choice(self.streets[settlement['id']] if settlement else self.regions)
+            char = self.add_titled(Character, 'character', {
+                'first_name': self.rand.choice(FIRST_NAMES[gender]),
+                'last_name': self.rand.choice(LAST_NAMES),
+                'gender': gender,
+                'skin_color': self.rand.choice(SKIN_COLOR_CHOICES)[0],
+                'hair_color': self.rand.choice(HAIR_COLOR_CHOICES)[0],
+                'hairstyle': self.rand.choice(HAIRSTYLE_CHOICES)[0],
+                'settlement_id': settlement['id'] if settlement else None,
+                'place_id': place['id'],
+                'faction_id': self.rand.choice(self.factions)['id'],
+                'gold': self.rand.randint(0, 1000),
+                **{attr: self.rand.randint(100, 1000) for attr in char_attrs_ranged}
+            })
+            self.characters.append((char, settlement, place))
+        population = Counter(place['id'] for _, _, place in self.characters)
+        for place in self.rows[Place]:
+            place['population'] = population[place['id']]
+
+    def generate_homes(self):
+        for char, settlement, place in self.characters:
+            home = get_home_plan(
+                SimpleNamespace(
+                    id=char['id'],
+                    title=char['title'],
+                    settlement_id=char['settlement_id'],
+                    settlement=SimpleNamespace(**settlement) if settlement else None
+                ),
+                SimpleNamespace(**place),
+                self.rand
+            )
+            places_ids = {
+                place_type: self.add(Place, data)['id']
+                for (place_type, _), data in zip(HOME_ROOMS, get_home_rooms(home))
+            }
+            places_ids['entrance'] = self.add(Place, get_home_entrance(home, places_ids['hallway']))['id']
+            for transition in get_home_transitions(home, places_ids):
+                self.add_transition(*transition)
+
+    def generate_relationships(self):
+        count = min(self.relationships_count, len(self.characters) - 1)
+        chars_ids = [char['id'] for char, _, _ in self.characters]
+        for char_id in chars_ids:
+            to_chars_ids = set()
+            while len(to_chars_ids) < count:
+                to_char_id = self.rand.choice(chars_ids)
+                if to_char_id != char_id:
+                    to_chars_ids.add(to_char_id)
+            for to_char_id in to_chars_ids:
+                self.add(CharacterRelationship, {
+                    'from_character_id': char_id, 'to_character_id': to_char_id, 'value': self.rand.randint(100, 1000)
+                })
+
+    def generate_plans(self):
+        """Plans restoring a need at the cost of another one, chosen by the need lack and filtered by a skill."""
+        self.plans = []
+        for _ in range(self.plans_count):
+            need, cost = self.rand.sample(NEEDS, 2)
+            char_filters = self.add(CharacterDataFilters, {
+                'filters': {f'{self.rand.choice(SKILLS)}__gte': self.rand.randint(100, 500)},
+                'plan_points_mods': {'negative': {'own': {'exact': need}}}
+            })
+            plan_filters = self.add(PlanFilters, {'first_character_id': char_filters['id']})
+            if self.rand.random() < .3:
+                hour_from = self.rand.randint(0, 23)
+                hour_to = (hour_from + self.rand.randint(2, 12)) % 24
+                plan_filters.update({
+                    'time_from': datetime.time(hour_from),
+                    'time_from_seconds': hour_from * 3600,
+                    'time_to': datetime.time(hour_to),
+                    'time_to_seconds': hour_to * 3600,
+                })
+            stages_ids = []
+            for _ in range(self.rand.randint(1, len(Plan.stages) - 2)):
+                effects = self.add(CharacterDataEffects, {
+                    'effects': {need: self.rand.randint(50, 200), cost: -self.rand.randint(10, 50)}
+                })
+                effects_set = self.add_titled(PlanEffectsSet, 'effects_set', {'one_id': effects['id']})
+                plan_effects = self.add(PlanEffects, {'first_character_id': effects_set['id']})
+                stages_ids.append(self.add(Stage, {'effects_id': plan_effects['id']})['id'])
+            self.plans.append(self.add_titled(Plan, 'plan', {
+                'name': f'Restore {need}',
+                'is_char_available': True,
+                'min_points': self.rand.randint(101, 600),
+                'filters_id': plan_filters['id'],
+                **{f'{k}_id': stage_id for k, stage_id in zip(Plan.stages, stages_ids)}
+            }))
+
+    def generate_events(self):
+        """Events ordered by characters and time like the EventLog indexes, so they are appended to them."""
+        seconds = self.days * 86400
+        events = sorted(
+            (self.rand.randrange(len(self.characters)), self.rand.randrange(seconds)) for _ in range(self.events_count)
+        )
+        for char_index, timestamp in events:
+            char, _, place = self.characters[char_index]
+            self.add(EventLog, {
+                'timestamp': timestamp,
+                'plan_id': self.rand.choice(self.plans)['id'] if self.plans else None,
+                'first_character_id': char['id'],
+                'place_id': place['id']
+            })
+
+
+def get_db_converter(field):
+    if isinstance(field, models.JSONField):
+        return json.dumps
+    if isinstance(field, models.TimeField):
+        return connection.ops.adapt_timefield_value
+    return None
+
+
+def insert_rows(model, rows, chunk_size=20000):
+    """Inserts rows ({attname: value}, defaults for missing values) with executemany."""
+    fields = model._meta.concrete_fields
+    defaults = []
+    converters = []
+    for index, field in enumerate(fields):
+        converter = get_db_converter(field)
+        default = field.get_default()
+        if converter:
+            converters.append((index, field.attname, converter))
+            default = converter(default) if default is not None else None
+        defaults.append((field.attname, default))
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join([connection.ops.quote_name(field.column) for field in fields]),
+        ', '.join(['%s'] * len(fields))
+    )
+    with connection.cursor() as cursor:
+        for chunk in iter_batches(rows, chunk_size):
+            values = []
+            for row in chunk:
+                items = [row[attname] if attname in row else default for attname, default in defaults]
+                for index, attname, converter in converters:
+                    if row.get(attname) is not None:
+                        items[index] = converter(row[attname])
+                values.append(items)
+            cursor.executemany(sql, values)
+
+
+def save_world(rows, phase=None):
+    """
+    Inserts the generated rows and the events rollups, phase(name) is a context manager around each step.
+    Plans, characters and places are new, so only hours rollups can exist already.
+    """
+    phase = phase or (lambda name: nullcontext())
+    for model in WORLD_MODELS:
+        with phase(model.__name__):
+            insert_rows(model, rows[model])
+    with phase('EventRollup'):
+        counts = get_rollups_counts(SimpleNamespace(**event) for event in rows[EventLog])
+        insert_rows(EventRollup, [
+            {'dimension': dimension, 'key': key, 'count': count}
+            for (dimension, key), count in counts.items() if dimension != 'hour'
+        ])
+        add_rollups_counts({
+            (dimension, key): count for (dimension, key), count in counts.items() if dimension == 'hour'
+        })